@@ -0,0 +1,162 @@
+import os
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
+# Custom bag model weights, and their ONNX export (see export_yolo_onnx.py).
+# best.pt is the YOLOv8 model trained on the plastic/paper/garbage bag dataset; it is
+# not kept in the repository, so copy it into backend/ (or point VISION_BAG_WEIGHTS
+# at it) before starting vision_service or running export_yolo_onnx.py
+BAG_WEIGHTS_PATH = os.path.join(os.path.dirname(__file__), "best.pt")
+BAG_ONNX_PATH = os.path.join(MODELS_DIR, "best.onnx")
+BAG_INT8_PATH = os.path.join(MODELS_DIR, "best.int8.onnx")
+
+def onnx_path(int8: bool = False) -> str:
+    return BAG_INT8_PATH if int8 else BAG_ONNX_PATH
+
+def letterbox(frame: np.ndarray, size: int):
+    """
+    Resize keeping the aspect ratio and pad to size x size with gray (114), centered,
+    the same way ultralytics prepares its input. Returns (image, scale, (pad_x, pad_y)).
+    """
+    h, w = frame.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    pad_x = (size - new_w) / 2
+    pad_y = (size - new_h) / 2
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    padded = cv2.copyMakeBorder(resized, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return padded, scale, (left, top)
+
+class UltralyticsBagDetector:
+    """Bag detection with the original PyTorch weights through ultralytics.YOLO."""
+    backend = "ultralytics"
+
+    def __init__(self, weights: str = BAG_WEIGHTS_PATH, conf: float = 0.3, imgsz: int = 320):
+        # Imported here so the ONNX backend never pulls in torch
+        from ultralytics import YOLO
+        self.model = YOLO(weights)
+        self.conf = conf
+        self.imgsz = imgsz
+
+    def detect(self, frames: List[np.ndarray]) -> List[List[Dict]]:
+        """Detections per BGR frame: {"box": (x1, y1, x2, y2), "confidence", "class"}."""
+        results = self.model(frames, verbose=False, conf=self.conf, imgsz=self.imgsz)
+        return [
+            [
+                {
+                    "box": tuple(float(v) for v in box.xyxy[0]),
+                    "confidence": float(box.conf[0]),
+                    "class": int(box.cls[0])
+                }
+                for box in result.boxes
+            ]
+            for result in results
+        ]
+
+class OnnxBagDetector:
+    """
+    Bag detection with an ONNX export of the YOLOv8 model, run by ONNX Runtime on CPU.
+    Pre- and post-processing (letterbox, box decoding, NMS) are done here with
+    NumPy/OpenCV, so neither torch nor ultralytics is imported.
+    """
+    backend = "onnx"
+
+    def __init__(
+        self,
+        model_path: str = BAG_ONNX_PATH,
+        conf: float = 0.3,
+        iou: float = 0.45,
+        intra_op_threads: int = 0
+    ):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.model_path = model_path
+        self.conf = conf
+        self.iou = iou
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.imgsz = int(model_input.shape[2]) if isinstance(model_input.shape[2], int) else 320
+        # Exported with dynamic=True the batch dimension is symbolic
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+
+    @staticmethod
+    def available(int8: bool = False) -> bool:
+        return os.path.exists(onnx_path(int8))
+
+    def _decode(self, output: np.ndarray, scale: float, pad) -> List[Dict]:
+        """(4 + classes, anchors) raw output -> detections in original frame pixels."""
+        predictions = output.T  # (anchors, 4 + classes)
+        scores = predictions[:, 4:]
+        classes = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), classes]
+        keep = confidences >= self.conf
+        if not np.any(keep):
+            return []
+
+        cx, cy, w, h = predictions[keep, :4].T
+        boxes = np.stack([cx - w / 2, cy - h / 2, w, h], axis=1)
+        confidences = confidences[keep]
+        classes = classes[keep]
+
+        # Class-aware NMS: shift each class to its own region so boxes of different
+        # classes never suppress each other
+        offsets = classes[:, None] * float(self.imgsz * 2)
+        shifted = boxes.copy()
+        shifted[:, :2] += offsets
+        kept = cv2.dnn.NMSBoxes(shifted.tolist(), confidences.tolist(), self.conf, self.iou)
+
+        detections = []
+        for i in np.array(kept).reshape(-1):
+            x, y, w, h = boxes[i]
+            x1 = (x - pad[0]) / scale
+            y1 = (y - pad[1]) / scale
+            detections.append({
+                "box": (float(x1), float(y1), float(x1 + w / scale), float(y1 + h / scale)),
+                "confidence": float(confidences[i]),
+                "class": int(classes[i])
+            })
+        return detections
+
+    def detect(self, frames: List[np.ndarray]) -> List[List[Dict]]:
+        """Detections per BGR frame: {"box": (x1, y1, x2, y2), "confidence", "class"}."""
+        if not frames:
+            return []
+
+        batch = np.empty((len(frames), 3, self.imgsz, self.imgsz), dtype=np.float32)
+        transforms = []
+        for i, frame in enumerate(frames):
+            padded, scale, pad = letterbox(frame, self.imgsz)
+            rgb = cv2.cvtColor(padded, cv2.COLOR_BGR2RGB)
+            np.multiply(rgb.transpose(2, 0, 1), 1.0 / 255.0, out=batch[i], casting="unsafe")
+            transforms.append((scale, pad))
+
+        if self.dynamic_batch:
+            outputs = self.session.run(None, {self.input_name: batch})[0]
+        else:
+            outputs = np.concatenate([
+                self.session.run(None, {self.input_name: batch[i:i + 1]})[0]
+                for i in range(len(frames))
+            ])
+
+        return [self._decode(output, scale, pad) for output, (scale, pad) in zip(outputs, transforms)]
+
+def load_bag_detector(backend: str = "auto", int8: bool = False, conf: float = 0.3, weights: str = BAG_WEIGHTS_PATH):
+    """
+    backend: "onnx", "ultralytics", or "auto" = onnx when the exported model exists.
+    """
+    if backend == "auto":
+        backend = "onnx" if OnnxBagDetector.available(int8) else "ultralytics"
+    if backend == "onnx":
+        return OnnxBagDetector(onnx_path(int8), conf=conf)
+    return UltralyticsBagDetector(weights, conf=conf)
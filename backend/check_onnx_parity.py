@@ -0,0 +1,96 @@
+import os
+import sys
+import json
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+try:
+    import cv2
+    import numpy as np
+    from deepface import DeepFace
+    from facenet_onnx import FACENET_INT8_PATH, OnnxFacenet, to_model_input
+    from face_detector import YuNetDetector
+except ImportError as e:
+    print(json.dumps({"success": False, "error": f"Missing library: {str(e)}"}))
+    sys.exit(1)
+
+# Parity check for FACE_ENGINE=onnx: verifies image pairs with DeepFace (Keras Facenet512 +
+# opencv detector, what deepface_service uses by default) and with the ONNX engine, and
+# reports the distance difference and whether the match decision agrees. The INT8 model is
+# loaded and checked too whenever it has been exported (--int8 makes it required).
+# Usage: python check_onnx_parity.py [--int8] <img1> <img2> [<img1> <img2> ...]
+THRESHOLD = 0.50
+MAX_DISTANCE_DELTA = 0.05
+
+def onnx_distance(model, detector, img1_path, img2_path):
+    target_size = tuple(model.input_shape[1:3])
+    embeddings = []
+    for img_path in (img1_path, img2_path):
+        img = cv2.imread(img_path)
+        if detector is not None:
+            faces = detector.extract_faces(img)
+        else:
+            faces = DeepFace.extract_faces(img_path=img, detector_backend="opencv", enforce_detection=False, align=True)
+        # RGB crops go in as BGR, the way DeepFace.represent feeds Facenet512
+        batch = np.stack([to_model_input(face["face"][:, :, ::-1], target_size) for face in faces])
+        vectors = model.predict_on_batch(batch)
+        embeddings.append(vectors / np.linalg.norm(vectors, axis=1, keepdims=True))
+    return float(1 - np.max(embeddings[0] @ embeddings[1].T))
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    int8 = "--int8" in args
+    args = [arg for arg in args if arg != "--int8"]
+    if len(args) < 2 or len(args) % 2:
+        print(json.dumps({"success": False, "error": "Usage: python check_onnx_parity.py [--int8] <img1> <img2> [...]"}))
+        sys.exit(1)
+
+    if int8 and not os.path.exists(FACENET_INT8_PATH):
+        print(json.dumps({"success": False, "error": f"INT8 model not found: {FACENET_INT8_PATH} (run export_facenet_onnx.py --int8)"}))
+        sys.exit(1)
+
+    engines = {"onnx": False}
+    if int8 or os.path.exists(FACENET_INT8_PATH):
+        engines["onnx-int8"] = True
+    try:
+        models = {name: OnnxFacenet(int8=quantized) for name, quantized in engines.items()}
+    except Exception as e:
+        print(json.dumps({"success": False, "error": f"Failed to load ONNX model: {str(e)}"}))
+        sys.exit(1)
+    detector = YuNetDetector() if YuNetDetector.available() else None
+
+    results = {name: [] for name in models}
+    for img1_path, img2_path in zip(args[0::2], args[1::2]):
+        reference = DeepFace.verify(
+            img1_path=img1_path,
+            img2_path=img2_path,
+            model_name="Facenet512",
+            detector_backend="opencv",
+            distance_metric="cosine",
+            enforce_detection=False,
+            align=True
+        )["distance"]
+        for name, model in models.items():
+            distance = onnx_distance(model, detector, img1_path, img2_path)
+            results[name].append({
+                "pair": [img1_path, img2_path],
+                "deepface_distance": reference,
+                "onnx_distance": distance,
+                "delta": abs(distance - reference),
+                "same_decision": (distance <= THRESHOLD) == (reference <= THRESHOLD)
+            })
+
+    passed = all(r["same_decision"] and r["delta"] <= MAX_DISTANCE_DELTA for rows in results.values() for r in rows)
+    print(json.dumps({
+        "success": passed,
+        "detector": "yunet" if detector is not None else "opencv",
+        "engines": {
+            name: {
+                "model": models[name].model_path,
+                "max_delta": max(r["delta"] for r in rows),
+                "results": rows
+            }
+            for name, rows in results.items()
+        }
+    }, indent=2))
+    sys.exit(0 if passed else 1)
@@ -2,6 +2,15 @@ import sys
 import json
 import os
 import traceback
+import base64
+import binascii
+import threading
+import queue
+import multiprocessing
+import time
+
+# Startup timings are reported in the status messages, so slow restarts can be diagnosed
+START_TIME = time.perf_counter()
 
 # 1. Redirect standard stdout to stderr to catch ALL noise (TF logs, etc.)
 # Keep a reference to the real stdout for our JSON usage
@@ -12,26 +21,145 @@ sys.stdout = sys.stderr
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # 3 = ERROR
 os.environ['TF_EnableOneDNNOpts'] = '0'
 
-# Now import heavy libraries
-from deepface import DeepFace
+# Now import heavy libraries (DeepFace/TensorFlow only when the engine needs them)
 from liveness_utils import LivenessDetector
+from embedding_cache import EmbeddingCache
+from face_index import ShopIndexStore
+from facenet_onnx import OnnxFacenet, to_model_input
+from face_detector import YuNetDetector, aligned_crop
+from image_utils import DETECT_MAX_SIDE, downscale_for_detection
+from frame_quality import FrameQualityScorer
 import cv2
 import numpy as np
 
+IMPORT_SECONDS = time.perf_counter() - START_TIME
+
+MODEL_NAME = "Facenet512"
+DETECTOR_BACKEND = "opencv"
+MATCH_THRESHOLD = 0.50  # Cosine distance
+
+# DeepFace module, imported on first use
+DeepFace = None
 # Global detector instance
 liveness_detector = None
+# ONNX face detector; None means DeepFace's opencv detector is used
+face_detector = None
+# Facenet512 model (Keras, or the pre-converted ONNX artifact), called directly so
+# several faces share one forward pass
+facenet_model = None
+# Global reference embedding cache
+embedding_cache = None
+# Shop-wide face indexes for card-less identification
+face_indexes = None
+# Cheap sharpness/exposure/pose check run on live frames before the models
+quality_scorer = None
+# A burst of live frames is always ranked and the best-scoring frame kept. By default
+# a burst whose frames are all unusable is rejected up front, so the client can retake
+# it; FACE_QUALITY_GATE=1 gates single frames too, FACE_QUALITY_GATE=0 never rejects
+QUALITY_GATE = os.environ.get('FACE_QUALITY_GATE', 'burst')
+# Stored photos embedded per forward pass by index_add_many
+try:
+    INDEX_CHUNK = max(1, int(os.environ.get('FACE_INDEX_CHUNK', 32)))
+except ValueError:
+    INDEX_CHUNK = 32
+# Set in pool workers: status lines go to the parent instead of stdout
+status_queue = None
+# Serializes writes to the real stdout (reader thread and main loop both answer)
+output_lock = threading.Lock()
+
+def get_deepface():
+    """Import DeepFace (and with it TensorFlow) on first use."""
+    global DeepFace
+    if DeepFace is None:
+        from deepface import DeepFace as deepface_module
+        DeepFace = deepface_module
+    return DeepFace
 
 def load_model():
     """
-    Preload the models by running a dummy verification and initializing liveness detector.
+    Preload the models and report how long each startup stage took.
+    With the ONNX engine, Facenet512 comes from the pre-converted artifact (see
+    export_facenet_onnx.py) and faces are detected with YuNet, so TensorFlow is
+    never imported.
     """
-    global liveness_detector
+    global liveness_detector, embedding_cache, facenet_model, face_indexes, face_detector, quality_scorer
+    timings = {"import": round(IMPORT_SECONDS, 3)}
+
+    def stage(name, started):
+        timings[name] = round(time.perf_counter() - started, 3)
+        write_status({"status": "loading", "stage": name, "seconds": timings[name],
+                      "message": f"Loaded {name} in {timings[name]:.2f}s"})
+
     try:
         # Send status to REAL stdout
-        real_stdout.write(json.dumps({"status": "loading", "message": "Loading Face Authentication models..."}) + "\n")
-        real_stdout.flush()
-        
-        DeepFace.build_model("Facenet512")
+        write_status({"status": "loading", "message": f"Loading Face Authentication models... (imports took {IMPORT_SECONDS:.2f}s)"})
+
+        # FACE_ENGINE: "onnx" (ONNX Runtime, no TensorFlow), "deepface" (Keras), or
+        # "auto" = onnx when the exported artifacts exist
+        engine = os.environ.get('FACE_ENGINE', 'auto').lower()
+        int8 = os.environ.get('FACE_ONNX_INT8', '0') == '1'
+        if engine == 'auto':
+            engine = 'onnx' if OnnxFacenet.available(int8) else 'deepface'
+
+        if engine == 'onnx':
+            try:
+                intra_threads = int(os.environ.get('FACE_ORT_INTRA_THREADS', 0))
+                inter_threads = int(os.environ.get('FACE_ORT_INTER_THREADS', 0))
+            except:
+                intra_threads, inter_threads = 0, 0
+
+            started = time.perf_counter()
+            facenet_model = OnnxFacenet(int8=int8, intra_op_threads=intra_threads, inter_op_threads=inter_threads)
+            stage("facenet_onnx_int8" if int8 else "facenet_onnx", started)
+
+            if YuNetDetector.available():
+                started = time.perf_counter()
+                face_detector = YuNetDetector()
+                stage("detector_onnx", started)
+        else:
+            started = time.perf_counter()
+            built = get_deepface().build_model(MODEL_NAME)
+            # Newer DeepFace versions wrap the Keras model in a client object
+            facenet_model = getattr(built, "model", built)
+            stage("facenet_keras", started)
+
+        if face_detector is None and DeepFace is None:
+            # DeepFace's opencv detector still needs DeepFace (and TensorFlow)
+            started = time.perf_counter()
+            get_deepface()
+            stage("deepface_import", started)
+
+        # Reference embeddings are cached by photo content so enrolled faces are embedded once
+        started = time.perf_counter()
+        cache_path = os.environ.get(
+            'FACE_EMBEDDING_CACHE',
+            os.path.join(os.path.dirname(__file__), "cache", "embeddings.sqlite3")
+        )
+        try:
+            cache_size = int(os.environ.get('FACE_EMBEDDING_CACHE_SIZE', 512))
+        except:
+            cache_size = 512
+        # Embeddings depend on the whole pipeline, so each engine/detector gets its own entries
+        # ("bgr": crops are fed in DeepFace's channel order; older entries were embedded from RGB)
+        pipeline = f"{MODEL_NAME}-{engine}{'-int8' if engine == 'onnx' and int8 else ''}-{'yunet' if face_detector else DETECTOR_BACKEND}-bgr"
+        if DETECT_MAX_SIDE:
+            pipeline += f"-d{DETECT_MAX_SIDE}"
+        embedding_cache = EmbeddingCache(cache_path, model_name=pipeline, capacity=cache_size)
+
+        index_dir = os.environ.get(
+            'FACE_INDEX_DIR',
+            os.path.join(os.path.dirname(__file__), "cache", "face_index")
+        )
+        face_indexes = ShopIndexStore(os.path.join(index_dir, pipeline), dim=facenet_model.output_shape[-1])
+        stage("caches", started)
+
+        started = time.perf_counter()
+        try:
+            min_sharpness = float(os.environ.get('FACE_QUALITY_MIN_SHARPNESS', 40))
+        except:
+            min_sharpness = 40.0
+        quality_scorer = FrameQualityScorer(min_sharpness=min_sharpness)
+        stage("quality", started)
         
         # Initialize Liveness Detector
         model_path = os.path.join(os.path.dirname(__file__), "models", "liveness_model.onnx")
@@ -42,124 +170,737 @@ def load_model():
             except:
                 env_threshold = 0.5
                 
-            liveness_detector = LivenessDetector(model_path, threshold=env_threshold)
-            real_stdout.write(json.dumps({"status": "ready", "message": f"Models loaded with Liveness Detection (th={env_threshold})"}) + "\n")
+            started = time.perf_counter()
+            # Session tuning; thread counts of 0 let ONNX Runtime decide
+            try:
+                liveness_threads = int(os.environ.get('LIVENESS_ORT_THREADS', 0))
+            except:
+                liveness_threads = 0
+            liveness_detector = LivenessDetector(
+                model_path,
+                threshold=env_threshold,
+                graph_optimization=os.environ.get('LIVENESS_ORT_OPTIMIZATION', 'all').lower(),
+                intra_op_threads=liveness_threads,
+                enable_mem_arena=os.environ.get('LIVENESS_ORT_MEM_ARENA', '1') == '1',
+                use_io_binding=os.environ.get('LIVENESS_IO_BINDING', '0') == '1'
+            )
+            stage("liveness", started)
+            message = f"Models loaded with Liveness Detection (th={env_threshold})"
         else:
-            real_stdout.write(json.dumps({"status": "ready", "message": "Models loaded (Liveness model missing)"}) + "\n")
-        
-        real_stdout.flush()
+            message = "Models loaded (Liveness model missing)"
+
+        timings["total"] = round(time.perf_counter() - START_TIME, 3)
+        write_status({"status": "ready", "timings": timings,
+                      "message": f"{message} in {timings['total']:.2f}s"})
     except Exception as e:
-        real_stdout.write(json.dumps({"status": "error", "error": f"Load error: {str(e)}"}) + "\n")
-        real_stdout.flush()
+        write_status({"status": "error", "error": f"Load error: {str(e)}"})
 
-def process_request(data):
+def load_image_bytes(data, name):
+    """
+    Return (encoded_bytes, error) for image `name` ("img1" = stored, "img2" = live).
+    An image can arrive as raw bytes framed after the JSON line ("<name>_len"), inline
+    as base64 or a data URI ("<name>"), or as a file path ("<name>_path").
+    """
+    label = "Stored" if name == "img1" else "Live"
+
+    raw = data.get(f"{name}_data")
+    if raw is not None:
+        return raw, None
+
+    inline = data.get(name)
+    if inline:
+        if inline.startswith("data:"):
+            inline = inline.split(",", 1)[-1]
+        try:
+            return base64.b64decode(inline), None
+        except (binascii.Error, ValueError):
+            return None, f"{label} image is not valid base64"
+
+    img_path = data.get(f"{name}_path")
+    if not img_path:
+        return None, f"Missing {label.lower()} image"
+    if not os.path.exists(img_path):
+        return None, f"{label} image not found: {img_path}"
+    with open(img_path, "rb") as f:
+        return f.read(), None
+
+def decode_image(img_bytes):
+    """Decode encoded image bytes straight into a BGR array, or None."""
+    if not img_bytes:
+        return None  # cv2.imdecode raises on an empty buffer
+    return cv2.imdecode(np.frombuffer(img_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def load_image_list(data, name):
+    """
+    Return (list of encoded images, error) for image `name`. Several images arrive
+    framed ("<name>_lens") or as a list of base64 strings / data URIs in "<name>";
+    anything else is a single image.
+    """
+    burst = data.get(f"{name}_burst_data")
+    if burst is None and isinstance(data.get(name), list):
+        burst = []
+        for inline in data[name]:
+            frame, error = load_image_bytes({name: inline}, name)
+            if error:
+                return None, error
+            burst.append(frame)
+    if burst is not None:
+        if not burst:
+            return None, f"Missing {'stored' if name == 'img1' else 'live'} image"
+        return burst, None
+
+    img_bytes, error = load_image_bytes(data, name)
+    if error:
+        return None, error
+    return [img_bytes], None
+
+def select_live_frame(data):
+    """
+    Decode the live frame(s) and keep the best one by FrameQualityScorer.
+    Returns (live_img, quality, error); quality is None when no scoring was needed.
+    """
+    frames, error = load_image_list(data, "img2")
+    if error:
+        return None, None, error
+
+    # Empty frames are skipped; positions are kept so frame_index refers to the caller's burst
+    positions = [i for i, frame in enumerate(frames) if frame]
+    if not positions:
+        return None, None, "Live image is empty"
+    decoded = [(i, decode_image(frames[i])) for i in positions]
+    decoded = [(i, img) for i, img in decoded if img is not None]
+    if not decoded:
+        return None, None, "Failed to read live image"
+    gate = QUALITY_GATE == '1' or (QUALITY_GATE == 'burst' and len(decoded) > 1)
+    if quality_scorer is None or (len(decoded) == 1 and not gate):
+        return decoded[0][1], None, None
+
+    best, quality = quality_scorer.rank([img for _, img in decoded], usable_first=gate)[0]
+    quality = dict(quality, frame_index=decoded[best][0], frames_scored=len(decoded))
+    if gate and not quality["usable"]:
+        return None, quality, f"No usable live frame ({', '.join(quality['reasons'])})"
+    return decoded[best][1], quality, None
+
+def face_area(face):
+    return face["facial_area"]["w"] * face["facial_area"]["h"]
+
+def liveness_bbox(faces):
+    """(x1, y1, x2, y2) of the largest detected face, or None when there is no face."""
+    if not faces:
+        return None
+    area = max(faces, key=face_area)["facial_area"]
+    return (area["x"], area["y"], area["x"] + area["w"], area["y"] + area["h"])
+
+def check_liveness(live_img, faces):
+    """Run liveness on the largest detected face of the live frame."""
+    liveness_result = {"is_liveness": True, "liveness_status": "skipped"}
+    
+    bbox = liveness_bbox(faces)
+    if bbox is not None and liveness_detector:
+        # Run Liveness Detection
+        liveness_result = liveness_detector.detect_liveness(live_img, bbox)
+
+    return liveness_result
+
+def full_size_face(img, face, scale):
+    """
+    Map a face found on the downscaled copy back onto the original frame and crop
+    it from there, aligned on the eyes the detector reported. Without eye landmarks
+    (or for the whole-frame fallback when nothing was detected) the box is cropped
+    as it is, just as DeepFace leaves such a face unaligned.
+    """
+    area = face["facial_area"]
+    left_eye, right_eye = area.get("left_eye"), area.get("right_eye")
+
+    height, width = img.shape[:2]
+    x, y = max(0, int(area["x"] / scale)), max(0, int(area["y"] / scale))
+    w = min(int(round(area["w"] / scale)), width - x)
+    h = min(int(round(area["h"] / scale)), height - y)
+    if left_eye and right_eye:
+        crop = aligned_crop(img, x, y, w, h, [v / scale for v in right_eye], [v / scale for v in left_eye])
+    else:
+        crop = img[y:y + h, x:x + w]
+    return {
+        "face": crop[:, :, ::-1].astype(np.float32) / 255.0,
+        "facial_area": {"x": x, "y": y, "w": w, "h": h},
+        "confidence": face.get("confidence", 0)
+    }
+
+def detect_faces(img):
+    """
+    Detect and align faces in an already decoded BGR frame. Detection runs on a
+    copy no larger than FACE_DETECT_MAX_SIDE; crops are taken from the original,
+    so each frame goes through the detector only once.
+    """
+    if face_detector is not None:
+        return face_detector.extract_faces(img, max_side=DETECT_MAX_SIDE)
+
+    small, scale = downscale_for_detection(img, DETECT_MAX_SIDE)
+    faces = get_deepface().extract_faces(
+        img_path=small,
+        detector_backend=DETECTOR_BACKEND,
+        enforce_detection=False,
+        align=True
+    )
+    if scale == 1.0:
+        return faces
+
+    return [full_size_face(img, face, scale) for face in faces]
+
+def embed_faces(faces):
+    """
+    Embed face crops returned by detect_faces, returning an (n_faces, dim) matrix.
+    Detection is skipped here so every frame is only run through the detector once,
+    and all crops go through Facenet512 as a single batch.
+    """
+    if not faces:
+        return np.zeros((0, facenet_model.output_shape[-1]), dtype=np.float32)
+
+    target_size = tuple(facenet_model.input_shape[1:3])
+    # extract_faces yields RGB floats in [0, 1]; DeepFace.represent flips them to BGR
+    # before Facenet512, and MATCH_THRESHOLD was calibrated on that
+    batch = np.stack([to_model_input(face["face"][:, :, ::-1], target_size) for face in faces])
+    return np.asarray(facenet_model.predict_on_batch(batch), dtype=np.float32)
+
+def get_reference_embeddings(img_bytes):
+    """
+    Return (embeddings, key, faces) for the encoded stored photo.
+    On a cache hit embeddings is set and faces is None; on a miss the detected faces
+    are returned so the caller can embed them together with the live faces.
+    """
+    key = EmbeddingCache.content_key(img_bytes)
+    if embedding_cache is not None:
+        cached = embedding_cache.get(key)
+        if cached is not None:
+            return cached, key, None
+
+    img = decode_image(img_bytes)
+    if img is None:
+        raise ValueError("Failed to read stored image")
+
+    # Largest face first, so row 0 of the cached matrix is the enrolled person
+    faces = sorted(detect_faces(img), key=face_area, reverse=True)
+    return None, key, faces
+
+def cosine_distance(ref_embeddings, live_embeddings):
+    """Smallest cosine distance over all reference/live face pairs (same as DeepFace.verify)."""
+    ref = ref_embeddings / np.linalg.norm(ref_embeddings, axis=1, keepdims=True)
+    live = live_embeddings / np.linalg.norm(live_embeddings, axis=1, keepdims=True)
+    return float(1 - np.max(ref @ live.T))
+
+def prepare_request(data):
+    """
+    Decode and detect for one request - liveness and embedding run batched afterwards.
+    Returns (response, context): response is set when the request already failed.
+    """
+    stored_bytes, error = load_image_bytes(data, "img1")
+    if error:
+        return {"success": False, "error": error}, None
+
+    # 1. Decode the live frame(s) once, in memory, and keep the best of a burst; a
+    # blurred or badly lit frame is turned away here, before any model runs
+    live_img, quality, error = select_live_frame(data)
+    if error:
+        return {"success": False, "error": error, "quality": quality}, None
+
+    # 2. Detect once - the same faces feed both liveness and embedding
+    faces = detect_faces(live_img)
+
+    # 3. Stored photo: the embedding comes from the cache when possible
+    ref_embeddings, ref_key, ref_faces = get_reference_embeddings(stored_bytes)
+
+    return None, {
+        "faces": faces,
+        "live_img": live_img,
+        "liveness": {"is_liveness": True, "liveness_status": "skipped"},
+        "ref_embeddings": ref_embeddings,
+        "ref_key": ref_key,
+        "ref_faces": ref_faces,
+        "quality": quality
+    }
+
+def finish_request(context, ref_embeddings, live_embeddings):
+    """Turn embeddings and the liveness result into the final response."""
+    liveness_result = context["liveness"]
+    cache_hit = context["ref_faces"] is None
+
+    distance = cosine_distance(ref_embeddings, live_embeddings)
+    is_match = distance <= MATCH_THRESHOLD
+    
+    # FINAL DECISION: Must be a match AND must be real (liveness)
+    is_liveness = liveness_result.get("is_liveness", False)
+    authenticated = is_match and is_liveness
+
+    # Log detailed info for debugging (visible in Node.js logs)
+    status_msg = f"Match: {is_match} (dist={distance:.3f}/{MATCH_THRESHOLD}), Liveness: {is_liveness} (score={liveness_result.get('liveness_score', 0):.3f}), RefCache: {'hit' if cache_hit else 'miss'}"
+    sys.stderr.write(f"[FaceService] {status_msg}\n")
+
+    return {
+        "success": True,
+        "authenticated": authenticated,
+        "match": is_match,
+        "liveness": is_liveness,
+        "liveness_status": liveness_result.get("liveness_status"),
+        "liveness_score": liveness_result.get("liveness_score"),
+        "confidence": 1 - distance,
+        "distance": distance,
+        "threshold": MATCH_THRESHOLD,
+        "reference_cached": cache_hit,
+        "quality": context["quality"],
+        "message": "Authenticated Successfully" if authenticated else 
+                   ("Face Mismatch" if not is_match else "Spoofing Detected (Liveness Failed)")
+    }
+
+def stored_embedding(data):
+    """Embedding of the (largest) face in the stored photo "img1", via the cache."""
+    stored_bytes, error = load_image_bytes(data, "img1")
+    if error:
+        raise ValueError(error)
+
+    embeddings, key, faces = get_reference_embeddings(stored_bytes)
+    if embeddings is None:
+        embeddings = embed_faces(faces)
+        if embedding_cache is not None:
+            embedding_cache.put(key, embeddings)
+    return embeddings[0]
+
+def handle_index_add(data):
+    """Enroll a stored photo ("img1") in a shop's face index under "face_id"."""
+    shop = data.get("shop")
+    face_id = data.get("face_id")
+    if not shop or not face_id:
+        return {"success": False, "error": "shop and face_id are required"}
+
+    size = face_indexes.add(shop, face_id, stored_embedding(data))
+    return {"success": True, "shop": shop, "face_id": face_id, "size": size}
+
+def handle_index_add_many(data):
+    """
+    Enroll several stored photos ("img1" list, one per "face_ids" entry) in a shop
+    and write its index file once. With "replace" the shop's index is rebuilt from
+    just these faces (used by the full rebuild). Photos are embedded in chunks of
+    INDEX_CHUNK, each chunk in one forward pass.
+    """
+    shop = data.get("shop")
+    face_ids = data.get("face_ids") or []
+    if not shop:
+        return {"success": False, "error": "shop is required"}
+
+    images = []
+    if face_ids:
+        images, error = load_image_list(data, "img1")
+        if error:
+            return {"success": False, "error": error}
+        if len(images) != len(face_ids):
+            return {"success": False, "error": "face_ids and images differ in length"}
+
+    faces, failed = [], []
+    for start in range(0, len(face_ids), INDEX_CHUNK):
+        pending = []  # (face_id, key, faces) of photos missing from the cache
+        for face_id, img_bytes in zip(face_ids[start:start + INDEX_CHUNK], images[start:start + INDEX_CHUNK]):
+            try:
+                embeddings, key, ref_faces = get_reference_embeddings(img_bytes)
+            except ValueError as e:
+                failed.append({"face_id": face_id, "error": str(e)})
+                continue
+            if embeddings is None:
+                pending.append((face_id, key, ref_faces))
+            elif len(embeddings):
+                faces.append((face_id, embeddings[0]))
+            else:
+                failed.append({"face_id": face_id, "error": "No face found"})
+
+        embedded = embed_faces([face for _, _, ref_faces in pending for face in ref_faces])
+        offset = 0
+        for face_id, key, ref_faces in pending:
+            embeddings = embedded[offset:offset + len(ref_faces)]
+            offset += len(ref_faces)
+            if embedding_cache is not None:
+                embedding_cache.put(key, embeddings)
+            if len(embeddings):
+                faces.append((face_id, embeddings[0]))
+            else:
+                failed.append({"face_id": face_id, "error": "No face found"})
+
+    size = face_indexes.add_many(shop, faces, replace=bool(data.get("replace")))
+    return {"success": True, "shop": shop, "added": len(faces), "failed": failed, "size": size}
+
+def handle_index_remove(data):
+    """
+    Remove faces from one shop's index, or from every shop when "shop" is omitted
+    (which loads and scans every index, so callers pass the shop they know). Matches "face_id" exactly, or every id starting with "prefix".
+    """
+    face_id = data.get("face_id")
+    prefix = data.get("prefix")
+    if face_id:
+        predicate = lambda candidate: candidate == face_id
+    elif prefix:
+        predicate = lambda candidate: candidate.startswith(prefix)
+    else:
+        return {"success": False, "error": "face_id or prefix is required"}
+
+    removed = face_indexes.remove(data.get("shop"), predicate)
+    return {"success": True, "removed": removed}
+
+def handle_search(data):
+    """
+    Identify the live face ("img2") among everyone enrolled at "shop".
+    Returns the k closest faces and whether the best one is within the match threshold.
+    """
+    shop = data.get("shop")
+    if not shop:
+        return {"success": False, "error": "shop is required"}
     try:
-        img1_path = data.get("img1_path")
-        img2_path = data.get("img2_path")
-
-        if not img1_path or not img2_path:
-            return {"success": False, "error": "Missing image paths"}
-
-        if not os.path.exists(img1_path):
-            return {"success": False, "error": f"Stored image not found: {img1_path}"}
-        if not os.path.exists(img2_path):
-            return {"success": False, "error": f"Live image not found: {img2_path}"}
-
-        # 1. Load Live Image for Liveness Check
-        live_img = cv2.imread(img2_path)
-        if live_img is None:
-            return {"success": False, "error": "Failed to read live image"}
-
-        # 2. Extract Face for Bounding Box (use for liveness)
-        # We use extract_faces to get both the face and its area/location
-        faces = DeepFace.extract_faces(
-            img_path=img2_path,
-            detector_backend="opencv",
-            enforce_detection=False,
-            align=True
-        )
+        k = max(1, int(data.get("k", 5)))
+    except (TypeError, ValueError):
+        k = 5
 
-        liveness_result = {"is_liveness": True, "liveness_status": "skipped"}
-        
-        if faces and len(faces) > 0:
-            # Pick the largest face
-            main_face = max(faces, key=lambda x: x["facial_area"]["w"] * x["facial_area"]["h"])
-            area = main_face["facial_area"]
-            bbox = (area["x"], area["y"], area["x"] + area["w"], area["y"] + area["h"])
-            
-            # Run Liveness Detection
-            if liveness_detector:
-                liveness_result = liveness_detector.detect_liveness(live_img, bbox)
-
-        # 3. Run Face Verification
-        # Optimization: Switching to 'opencv' detector for speed (RetinaFace is too slow on CPU)
-        result = DeepFace.verify(
-            img1_path=img1_path,
-            img2_path=img2_path,
-            model_name="Facenet512",
-            detector_backend="opencv", 
-            distance_metric="cosine",
-            enforce_detection=False,
-            align=True
+    live_img, quality, error = select_live_frame(data)
+    if error:
+        return {"success": False, "error": error, "quality": quality}
+
+    faces = detect_faces(live_img)
+    liveness_result = check_liveness(live_img, faces)
+    if not faces:
+        return {"success": False, "error": "No face found in live image"}
+
+    embedding = embed_faces([max(faces, key=face_area)])[0]
+    candidates = [
+        {"face_id": face_id, "distance": 1 - similarity, "confidence": similarity}
+        for face_id, similarity in face_indexes.search(shop, embedding, k)
+    ]
+
+    is_match = bool(candidates) and candidates[0]["distance"] <= MATCH_THRESHOLD
+    is_liveness = liveness_result.get("is_liveness", False)
+    return {
+        "success": True,
+        "match": is_match,
+        "liveness": is_liveness,
+        "liveness_status": liveness_result.get("liveness_status"),
+        "authenticated": is_match and is_liveness,
+        "face_id": candidates[0]["face_id"] if is_match else None,
+        "candidates": candidates,
+        "threshold": MATCH_THRESHOLD,
+        "quality": quality
+    }
+
+# Non-verification operations, selected with the request's "op" field
+OPERATIONS = {
+    "index_add": handle_index_add,
+    "index_add_many": handle_index_add_many,
+    "index_remove": handle_index_remove,
+    "search": handle_search
+}
+
+def process_batch(requests):
+    """
+    Verify several requests at once. Detection runs per image, liveness runs per
+    crop (its scores are not batch-invariant, see LivenessDetector), and the
+    live faces and any uncached stored faces are embedded in one Facenet512 forward pass. Index/search operations ("op") are answered one by one.
+    Returns one response per request, in the same order.
+    """
+    responses = [None] * len(requests)
+    contexts = []
+
+    for i, data in enumerate(requests):
+        try:
+            op = data.get("op", "verify")
+            if op in OPERATIONS:
+                responses[i] = OPERATIONS[op](data)
+                continue
+            if op != "verify":
+                responses[i] = {"success": False, "error": f"Unknown op: {op}"}
+                continue
+            response, context = prepare_request(data)
+        except Exception as e:
+            response, context = {"success": False, "error": f"Processing error: {str(e)}"}, None
+        if response is not None:
+            responses[i] = response
+        else:
+            contexts.append((i, context))
+
+    if not contexts:
+        return responses
+
+    # Liveness for the largest live face of every request, one crop at a time
+    checked = [(context, liveness_bbox(context["faces"])) for _, context in contexts]
+    checked = [(context, bbox) for context, bbox in checked if bbox is not None]
+    if liveness_detector and checked:
+        results = liveness_detector.detect_liveness_batch(
+            [context["live_img"] for context, _ in checked],
+            [bbox for _, bbox in checked]
         )
+        for (context, _), liveness_result in zip(checked, results):
+            context["liveness"] = liveness_result
 
-        distance = result["distance"]
-        CUSTOM_THRESHOLD = 0.50
-        is_match = distance <= CUSTOM_THRESHOLD
-        
-        # FINAL DECISION: Must be a match AND must be real (liveness)
-        is_liveness = liveness_result.get("is_liveness", False)
-        authenticated = is_match and is_liveness
-
-        # Log detailed info for debugging (visible in Node.js logs)
-        status_msg = f"Match: {is_match} (dist={distance:.3f}/{CUSTOM_THRESHOLD}), Liveness: {is_liveness} (score={liveness_result.get('liveness_score', 0):.3f})"
-        sys.stderr.write(f"[FaceService] {status_msg}\n")
-
-        return {
-            "success": True,
-            "authenticated": authenticated,
-            "match": is_match,
-            "liveness": is_liveness,
-            "liveness_status": liveness_result.get("liveness_status"),
-            "liveness_score": liveness_result.get("liveness_score"),
-            "confidence": 1 - distance,
-            "distance": distance,
-            "threshold": CUSTOM_THRESHOLD,
-            "message": "Authenticated Successfully" if authenticated else 
-                       ("Face Mismatch" if not is_match else "Spoofing Detected (Liveness Failed)")
-        }
+    try:
+        # Gather every crop that needs embedding, remembering where each request's slice lives
+        crops = []
+        for _, context in contexts:
+            context["live_slice"] = (len(crops), len(crops) + len(context["faces"]))
+            crops.extend(context["faces"])
+            if context["ref_faces"] is not None:
+                context["ref_slice"] = (len(crops), len(crops) + len(context["ref_faces"]))
+                crops.extend(context["ref_faces"])
 
+        embeddings = embed_faces(crops)
     except Exception as e:
-        return {"success": False, "error": f"Processing error: {str(e)}"}
+        for i, _ in contexts:
+            responses[i] = {"success": False, "error": f"Processing error: {str(e)}"}
+        return responses
+
+    for i, context in contexts:
+        try:
+            start, end = context["live_slice"]
+            live_embeddings = embeddings[start:end]
+
+            ref_embeddings = context["ref_embeddings"]
+            if ref_embeddings is None:
+                start, end = context["ref_slice"]
+                ref_embeddings = embeddings[start:end]
+                if embedding_cache is not None:
+                    embedding_cache.put(context["ref_key"], ref_embeddings)
+
+            responses[i] = finish_request(context, ref_embeddings, live_embeddings)
+        except Exception as e:
+            responses[i] = {"success": False, "error": f"Processing error: {str(e)}"}
+
+    return responses
+
+def process_request(data):
+    return process_batch([data])[0]
+
+def write_response(response, data=None):
+    """Write one JSON response to the REAL stdout, echoing the request id if one was sent."""
+    if isinstance(data, dict) and "id" in data:
+        response["id"] = data["id"]
+    with output_lock:
+        real_stdout.write(json.dumps(response) + "\n")
+        real_stdout.flush()
+
+def write_status(status):
+    if status_queue is not None:
+        # Pool worker: the parent owns stdout and forwards the status
+        status_queue.put(("status", os.getpid(), status))
+        return
+    with output_lock:
+        real_stdout.write(json.dumps(status) + "\n")
+        real_stdout.flush()
+
+def read_stdin(pending):
+    """
+    Reader thread: parse stdin lines into the pending queue so requests can be drained
+    in batches or handed to workers. Invalid lines are answered right away.
+
+    A JSON line may declare "img1_len" / "img2_len"; that many raw image bytes then
+    follow the newline (stored image first) and are attached as "img1_data" / "img2_data",
+    so callers can send captures without base64 or temporary files. Several images
+    (a burst of live frames, or the photos of an index rebuild) are declared as
+    "<name>_lens": [n1, n2, ...] and attached as "<name>_burst_data".
+    A request with a malformed length is answered with an error and the loop goes on.
+    """
+    stdin = sys.stdin.buffer
+    for line in iter(stdin.readline, b""):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            write_response({"success": False, "error": "Invalid JSON input"})
+            continue
+
+        if isinstance(data, dict):
+            error = read_frames(stdin, data)
+            if error:
+                write_response({"success": False, "error": error}, data)
+                continue
+        pending.put(data)
+    pending.put(None)
+
+def valid_length(length):
+    return isinstance(length, int) and not isinstance(length, bool) and length >= 0
+
+def read_frames(stdin, data):
+    """
+    Attach the raw image bytes declared by data's length fields. Every length is
+    checked before anything is read. Returns an error message, or None.
+    """
+    for name in ("img1", "img2"):
+        length = data.get(f"{name}_len")
+        if length is not None and not valid_length(length):
+            return f"{name}_len must be a non-negative integer"
+        lengths = data.get(f"{name}_lens")
+        if lengths is not None and not (isinstance(lengths, list) and all(valid_length(n) for n in lengths)):
+            return f"{name}_lens must be a list of non-negative integers"
+
+    for name in ("img1", "img2"):
+        length = data.get(f"{name}_len")
+        if length:
+            data[f"{name}_data"] = stdin.read(length)
+            if len(data[f"{name}_data"]) != length:
+                return f"Input ended inside {name} ({length} bytes declared)"
+        lengths = data.get(f"{name}_lens")
+        if lengths is not None:
+            data[f"{name}_burst_data"] = [stdin.read(n) for n in lengths]
+            if sum(len(frame) for frame in data[f"{name}_burst_data"]) != sum(lengths):
+                return f"Input ended inside {name} ({sum(lengths)} bytes declared)"
+    return None
+
+def take_batch(pending, batch_size):
+    """Block for one request, then drain whatever else is already waiting. Returns (batch, eof)."""
+    data = pending.get()
+    if data is None:
+        return [], True
+
+    batch = [data]
+    while len(batch) < batch_size:
+        try:
+            data = pending.get_nowait()
+        except queue.Empty:
+            break
+        if data is None:
+            return batch, True
+        batch.append(data)
+    return batch, False
+
+def serve(batch_size):
+    """Single-process loop: requests are answered in this process, batch by batch."""
+    pending = queue.Queue()
+    threading.Thread(target=read_stdin, args=(pending,), daemon=True).start()
 
-def main():
-    load_model()
-    
     # Process Loop - Read from stdin
-    while True:
+    eof = False
+    while not eof:
         try:
-            line = sys.stdin.readline()
-            if not line:
-                break
-            line = line.strip()
-            if not line:
+            batch, eof = take_batch(pending, batch_size)
+            if not batch:
                 continue
-            
-            try:
-                data = json.loads(line)
-                response = process_request(data)
-                
-                # Write ONLY to REAL stdout
-                real_stdout.write(json.dumps(response) + "\n")
-                real_stdout.flush()
-                
-            except json.JSONDecodeError:
-                real_stdout.write(json.dumps({"success": False, "error": "Invalid JSON input"}) + "\n")
-                real_stdout.flush()
+
+            for data, response in zip(batch, process_batch(batch)):
+                write_response(response, data)
                 
         except Exception as e:
-            real_stdout.write(json.dumps({"success": False, "error": f"Unexpected loop error: {str(e)}"}) + "\n")
-            real_stdout.flush()
+            write_response({"success": False, "error": f"Unexpected loop error: {str(e)}"})
+
+def worker_loop(tasks, results, batch_size):
+    """
+    Pool worker. The parent never loads a model, so each worker loads its own copy
+    here, after the fork: neither TensorFlow nor ONNX Runtime sessions survive fork().
+    Memory is therefore one full set of models per worker.
+    """
+    global status_queue
+    pid = os.getpid()
+    status_queue = results
+    load_model()
+
+    eof = False
+    while not eof:
+        batch, eof = take_batch(tasks, batch_size)
+        if not batch:
+            continue
+
+        # Tell the parent what we hold, so it can answer for us if we crash
+        results.put(("start", pid, [data.get("id") if isinstance(data, dict) else None for data in batch]))
+        for data, response in zip(batch, process_batch(batch)):
+            if isinstance(data, dict) and "id" in data:
+                response["id"] = data["id"]
+            results.put(("done", pid, response))
+
+def serve_pool(num_workers, batch_size):
+    """
+    Pre-forked worker pool. The parent only reads stdin into a shared task queue and
+    writes replies; workers load the models themselves, take requests as they become
+    free, and the parent writes their replies (tagged with the request id) in
+    completion order. A crashed worker only fails its own requests and is replaced.
+    """
+    ctx = multiprocessing.get_context("fork")
+    tasks = ctx.Queue()
+    results = ctx.Queue()
+
+    def spawn_worker():
+        worker = ctx.Process(target=worker_loop, args=(tasks, results, batch_size), daemon=True)
+        worker.start()
+        return worker
+
+    workers = [spawn_worker() for _ in range(num_workers)]
+    in_flight = {}  # worker pid -> ids of the requests it is working on
+    input_closed = threading.Event()
+
+    def feed_tasks():
+        pending = queue.Queue()
+        threading.Thread(target=read_stdin, args=(pending,), daemon=True).start()
+        while True:
+            data = pending.get()
+            if data is None:
+                break
+            tasks.put(data)
+        # One end-of-input marker per live worker; replacements spawned after this get their own
+        input_closed.set()
+        for _ in range(len(workers)):
+            tasks.put(None)
+
+    threading.Thread(target=feed_tasks, daemon=True).start()
+    write_status({"status": "loading", "message": f"Worker pool started ({num_workers} workers), loading models in each"})
+
+    def handle(kind, pid, payload):
+        if kind == "status":
+            write_status(dict(payload, worker=pid))
+        elif kind == "start":
+            in_flight[pid] = [request_id for request_id in payload if request_id is not None]
+        else:
+            if "id" in payload and payload["id"] in in_flight.get(pid, []):
+                in_flight[pid].remove(payload["id"])
+            write_response(payload)
+
+    while workers:
+        try:
+            handle(*results.get(timeout=0.5))
+        except queue.Empty:
+            pass
+
+        # Checked on every iteration, so a dead worker's requests fail right away
+        for worker in list(workers):
+            if worker.is_alive():
+                continue
+            # Replies it sent before dying are still in the queue: deliver those first
+            while True:
+                try:
+                    handle(*results.get_nowait())
+                except queue.Empty:
+                    break
+            workers.remove(worker)
+            for request_id in in_flight.pop(worker.pid, []):
+                write_response({"success": False, "error": "Face worker crashed while processing request"}, {"id": request_id})
+            if worker.exitcode != 0:
+                write_status({"status": "error", "error": f"Worker {worker.pid} exited with code {worker.exitcode}, restarting"})
+                workers.append(spawn_worker())
+                if input_closed.is_set():
+                    tasks.put(None)
+
+def main():
+    # FACE_BATCH_SIZE > 1 lets simultaneous requests from several counters share one
+    # forward pass; replies carry the request "id" because callers must not rely on order
+    try:
+        batch_size = max(1, int(os.environ.get('FACE_BATCH_SIZE', 1)))
+    except:
+        batch_size = 1
+
+    # FACE_WORKERS > 1 forks that many workers, each loading its own models
+    try:
+        num_workers = max(1, int(os.environ.get('FACE_WORKERS', 1)))
+    except:
+        num_workers = 1
+
+    if num_workers > 1 and not hasattr(os, "fork"):
+        write_status({"status": "ready", "message": "Worker pool needs fork(); running a single worker"})
+        num_workers = 1
+
+    if num_workers > 1:
+        serve_pool(num_workers, batch_size)
+    else:
+        load_model()
+        serve(batch_size)
 
 if __name__ == "__main__":
     main()
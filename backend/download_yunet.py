@@ -0,0 +1,25 @@
+import os
+import urllib.request
+
+# YuNet face detector (ONNX) used by the ONNX face engine in deepface_service.py
+models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+os.makedirs(models_dir, exist_ok=True)
+
+url = "https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/face_detection_yunet_2023mar.onnx"
+output_path = os.path.join(models_dir, "face_detection_yunet_2023mar.onnx")
+
+if os.path.exists(output_path):
+    print(f"Model already exists at {output_path}")
+    if os.path.getsize(output_path) < 100000: # Check if corrupted
+        print("File seems too small, re-downloading...")
+        os.remove(output_path)
+    else:
+        print("Skipping download.")
+        exit(0)
+
+print(f"Downloading YuNet face detector to {output_path}...")
+try:
+    urllib.request.urlretrieve(url, output_path)
+    print("Download complete!")
+except Exception as e:
+    print(f"Download failed: {e}")
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Persistent store of face embeddings for enrolled (stored) photos.
+
+    Entries are keyed by a SHA-256 of the image bytes, so a re-uploaded photo
+    gets a fresh entry and an unchanged one is never embedded twice. Recently
+    used vectors live in an in-memory LRU; everything is backed by a SQLite
+    file so the cache survives service restarts.
+    """
+
+    def __init__(self, db_path: str, model_name: str = "Facenet512", capacity: int = 512):
+        self.db_path = db_path
+        self.model_name = model_name
+        self.capacity = max(1, capacity)
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = None
+        self._conn_pid = None
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT NOT NULL,"
+            " model TEXT NOT NULL,"
+            " dim INTEGER NOT NULL,"
+            " vectors BLOB NOT NULL,"
+            " PRIMARY KEY (key, model))"
+        )
+        self._conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """SQLite connections must not cross fork(), so each process opens its own."""
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def content_key(data: bytes) -> str:
+        """Hash raw image bytes into a cache key."""
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Return the (n_faces, dim) embedding matrix for key, or None on a miss."""
+        with self._lock:
+            vectors = self._memory.get(key)
+            if vectors is not None:
+                self._memory.move_to_end(key)
+                return vectors
+
+            row = self._connection().execute(
+                "SELECT dim, vectors FROM embeddings WHERE key = ? AND model = ?",
+                (key, self.model_name)
+            ).fetchone()
+            if row is None:
+                return None
+
+            dim, blob = row
+            vectors = np.frombuffer(blob, dtype=np.float32).reshape(-1, dim)
+            self._remember(key, vectors)
+            return vectors
+
+    def put(self, key: str, vectors: np.ndarray) -> None:
+        """Store embeddings for key in memory and on disk."""
+        vectors = np.ascontiguousarray(np.atleast_2d(vectors), dtype=np.float32)
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vectors) VALUES (?, ?, ?, ?)",
+                (key, self.model_name, int(vectors.shape[1]), vectors.tobytes())
+            )
+            conn.commit()
+            self._remember(key, vectors)
+
+    def _remember(self, key: str, vectors: np.ndarray) -> None:
+        """Insert into the in-memory LRU, evicting the least recently used entries."""
+        self._memory[key] = vectors
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._memory)
@@ -0,0 +1,58 @@
+import os
+import sys
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+try:
+    import numpy as np
+    import onnxruntime as ort
+    import tensorflow as tf
+    import tf2onnx
+    from deepface import DeepFace
+except ImportError as e:
+    print(f"Missing library: {e} (pip install tf2onnx onnxruntime deepface)")
+    exit(1)
+
+from facenet_onnx import MODELS_DIR, FACENET_ONNX_PATH, FACENET_INT8_PATH, model_paths
+
+# One-time conversion of the DeepFace Facenet512 weights to ONNX, so deepface_service
+# can run with FACE_ENGINE=onnx and start without TensorFlow.
+# Usage: python export_facenet_onnx.py [--int8]
+int8 = "--int8" in sys.argv[1:]
+os.makedirs(MODELS_DIR, exist_ok=True)
+
+print("Building Facenet512 (Keras)...")
+built = DeepFace.build_model("Facenet512")
+keras_model = getattr(built, "model", built)
+height, width = keras_model.input_shape[1:3]
+
+print(f"Converting to ONNX: {FACENET_ONNX_PATH}")
+spec = (tf.TensorSpec((None, height, width, 3), tf.float32, name="input"),)
+tf2onnx.convert.from_keras(keras_model, input_signature=spec, opset=13, output_path=FACENET_ONNX_PATH)
+
+if int8:
+    # Dynamic INT8 quantization: weights stored as 8-bit, activations quantized at run time.
+    # Unsigned weights: the CPU provider has no ConvInteger kernel for signed int8 weights,
+    # so a QInt8 conv net would fail to load
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    print(f"Quantizing to INT8: {FACENET_INT8_PATH}")
+    quantize_dynamic(FACENET_ONNX_PATH, FACENET_INT8_PATH, weight_type=QuantType.QUInt8)
+
+sample = np.random.default_rng(0).random((4, height, width, 3), dtype=np.float32)
+expected = keras_model.predict_on_batch(sample)
+
+for quantized in ([False, True] if int8 else [False]):
+    model_path, optimized_path = model_paths(quantized)
+
+    # Let ONNX Runtime optimize the graph once and keep the result
+    if os.path.exists(optimized_path):
+        os.remove(optimized_path)
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.optimized_model_filepath = optimized_path
+    session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+    print(f"Saved optimized graph: {optimized_path}")
+
+    # Sanity check against Keras (check_onnx_parity.py compares real verification distances)
+    actual = session.run(None, {session.get_inputs()[0].name: sample})[0]
+    print(f"Max abs difference vs Keras ({'int8' if quantized else 'fp32'}): {np.abs(expected - actual).max():.2e}")
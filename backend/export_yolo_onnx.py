@@ -0,0 +1,52 @@
+import os
+import shutil
+import sys
+
+try:
+    import numpy as np
+    import onnxruntime as ort
+    from ultralytics import YOLO
+except ImportError as e:
+    print(f"Missing library: {e} (pip install ultralytics onnx onnxruntime)")
+    exit(1)
+
+from bag_detector import MODELS_DIR, BAG_WEIGHTS_PATH, BAG_ONNX_PATH, BAG_INT8_PATH, OnnxBagDetector, UltralyticsBagDetector
+
+# One-time export of the YOLO bag detector to ONNX, so vision_service can run with
+# VISION_BACKEND=onnx and start without torch/ultralytics.
+# Usage: python export_yolo_onnx.py [weights.pt] [--int8]
+#   weights.pt  the custom-trained bag model, backend/best.pt by default (see bag_detector.py)
+#   --int8      also write a dynamically quantized model (best.int8.onnx)
+args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+weights = args[0] if args else BAG_WEIGHTS_PATH
+int8 = "--int8" in sys.argv[1:]
+IMGSZ = 320  # Same input size the service has always used
+os.makedirs(MODELS_DIR, exist_ok=True)
+
+def export(weights_path, output_path):
+    print(f"Exporting {weights_path} -> {output_path}")
+    # dynamic=True keeps the batch dimension open so several cameras share one call
+    exported = YOLO(weights_path).export(format="onnx", imgsz=IMGSZ, dynamic=True, simplify=True, opset=12)
+    shutil.move(exported, output_path)
+
+export(weights, BAG_ONNX_PATH)
+
+if int8:
+    # Dynamic INT8 quantization: weights stored as int8, activations quantized at run time
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    print(f"Quantizing to INT8: {BAG_INT8_PATH}")
+    quantize_dynamic(BAG_ONNX_PATH, BAG_INT8_PATH, weight_type=QuantType.QUInt8)
+
+# Sanity check: the ONNX path must find the same boxes as ultralytics on a sample frame
+sample_path = os.path.join(os.path.dirname(__file__), "images", "bag_sample.jpg")
+if os.path.exists(sample_path):
+    import cv2
+    frame = cv2.resize(cv2.imread(sample_path), (640, 480))
+    expected = UltralyticsBagDetector(weights).detect([frame])[0]
+    for model_path in ([BAG_ONNX_PATH, BAG_INT8_PATH] if int8 else [BAG_ONNX_PATH]):
+        actual = OnnxBagDetector(model_path).detect([frame])[0]
+        print(f"{os.path.basename(model_path)}: {len(actual)} detections (ultralytics: {len(expected)})")
+else:
+    session = ort.InferenceSession(BAG_ONNX_PATH, providers=["CPUExecutionProvider"])
+    output = session.run(None, {session.get_inputs()[0].name: np.zeros((2, 3, IMGSZ, IMGSZ), dtype=np.float32)})[0]
+    print(f"ONNX model runs, output shape {output.shape} (add images/bag_sample.jpg to compare detections)")
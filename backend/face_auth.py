@@ -5,12 +5,114 @@ import os
 try:
     import face_recognition
     import numpy as np
+    from image_utils import (face_encodings_downscaled, map_references, early_exit_distance,
+                            EARLY_EXIT_DISTANCE, REF_WORKERS, REF_POOL)
 except ImportError:
     # Fallback for environments without face_recognition installed
     print(json.dumps({"success": False, "error": "Missing libraries: face_recognition/numpy"}))
     sys.exit(1)
 
-def verify_face(live_image_path, known_image_paths):
+ENCODING_DIM = 128
+MATCH_TOLERANCE = 0.5 # tolerance=0.6 is default. Lower is stricter.
+
+def card_encodings_path(card_id, known_image_paths):
+    """The card's encoding matrix is kept next to its photos as <card_id>_encodings.npz"""
+    folder = os.path.dirname(os.path.abspath(known_image_paths[0]))
+    return os.path.join(folder, f"{card_id}_encodings.npz")
+
+def encode_photo(known_path):
+    """(stamp, has_face, encoding) for one family photo, or None if it cannot be read."""
+    info = os.stat(known_path)
+    stamp = f"{info.st_size}:{info.st_mtime_ns}"
+    try:
+        known_image = face_recognition.load_image_file(known_path)
+        known_encodings = face_encodings_downscaled(known_image)
+    except:
+        return None # Skip bad known images
+
+    if len(known_encodings) > 0:
+        return (stamp, True, known_encodings[0])
+    # Remember photos without a face too, so they are not re-encoded every call
+    return (stamp, False, np.zeros(ENCODING_DIM))
+
+def load_card_encodings(known_image_paths, card_id=None, live_encoding=None,
+                        early_exit=None, workers=1, pool="thread"):
+    """
+    Stack one encoding per family photo into an (n_members, 128) matrix.
+    With a card_id the matrix is persisted alongside the card's photos, and only
+    photos that were added or changed (size/mtime) since the last call are re-encoded.
+    Those are encoded on a pool when workers > 1, and with live_encoding and
+    early_exit encoding stops once a photo matches within early_exit of the live face
+    (clamped to MATCH_TOLERANCE; the skipped photos are encoded on a later call).
+    Returns (paths, matrix) with one path (as passed in) per matrix row.
+    """
+    cache_path = card_encodings_path(card_id, known_image_paths) if card_id and known_image_paths else None
+
+    cached = {}
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as stored:
+                for path, stamp, valid, encoding in zip(stored["paths"], stored["stamps"], stored["valid"], stored["encodings"]):
+                    cached[str(path)] = (str(stamp), bool(valid), encoding)
+        except Exception:
+            cached = {} # Corrupt or old format - rebuild it
+
+    early_exit = early_exit_distance(early_exit, MATCH_TOLERANCE)
+
+    def confident(entry):
+        return (early_exit is not None and live_encoding is not None and entry[1]
+                and face_recognition.face_distance([entry[2]], live_encoding)[0] <= early_exit)
+
+    entries = {}
+    given_paths = {} # absolute path -> path as passed in
+    todo = []
+    for known_path in known_image_paths:
+        if not os.path.exists(known_path):
+            continue
+
+        key = os.path.abspath(known_path)
+        given_paths[key] = known_path
+        info = os.stat(known_path)
+        stamp = f"{info.st_size}:{info.st_mtime_ns}"
+
+        hit = cached.get(key)
+        if hit and hit[0] == stamp:
+            entries[key] = hit
+            continue
+        todo.append(known_path)
+
+    changed = False
+    # Nothing new needs encoding if a cached photo already settles the match
+    if todo and not any(confident(entry) for entry in entries.values()):
+        for index, entry in map_references(encode_photo, todo, workers, pool):
+            changed = True
+            if entry is None:
+                continue
+            entries[os.path.abspath(todo[index])] = entry
+            if confident(entry):
+                break
+
+    # Keep rows in the order the photos were given, however the pool finished
+    entries = {key: entries[key] for key in given_paths if key in entries}
+
+    if cache_path and (changed or set(entries) != set(cached)):
+        paths = list(entries)
+        tmp_path = cache_path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            paths=np.array(paths, dtype=str),
+            stamps=np.array([entries[p][0] for p in paths], dtype=str),
+            valid=np.array([entries[p][1] for p in paths], dtype=bool),
+            encodings=np.array([entries[p][2] for p in paths]).reshape(-1, ENCODING_DIM)
+        )
+        os.replace(tmp_path, cache_path)
+
+    keys = [key for key, entry in entries.items() if entry[1]]
+    matrix = np.array([entries[key][2] for key in keys]).reshape(-1, ENCODING_DIM)
+    return [given_paths[key] for key in keys], matrix
+
+def verify_face(live_image_path, known_image_paths, card_id=None,
+                early_exit=EARLY_EXIT_DISTANCE, workers=REF_WORKERS, pool=REF_POOL):
     try:
         if not os.path.exists(live_image_path):
             return {"success": False, "error": "Live image not found"}
@@ -18,7 +120,7 @@ def verify_face(live_image_path, known_image_paths):
         # Load live image once
         try:
             live_image = face_recognition.load_image_file(live_image_path)
-            live_encodings = face_recognition.face_encodings(live_image)
+            live_encodings = face_encodings_downscaled(live_image)
         except Exception as e:
             return {"success": False, "error": f"Failed to process live image: {str(e)}"}
 
@@ -27,50 +129,32 @@ def verify_face(live_image_path, known_image_paths):
         
         live_encoding = live_encodings[0] # Use the first face found
 
-        best_match_confidence = 0.0
-        is_match = False
-        
-        checked_count = 0
+        # All family members of the card, one encoding per row
+        member_paths, member_encodings = load_card_encodings(
+            known_image_paths, card_id, live_encoding, early_exit, workers, pool
+        )
 
-        # Iterate through all known images
-        for known_path in known_image_paths:
-            if not os.path.exists(known_path):
-                continue
-            
-            try:
-                known_image = face_recognition.load_image_file(known_path)
-                known_encodings = face_recognition.face_encodings(known_image)
-
-                if len(known_encodings) > 0:
-                    checked_count += 1
-                    # Compare
-                    # tolerance=0.6 is default. Lower is stricter.
-                    match = face_recognition.compare_faces([known_encodings[0]], live_encoding, tolerance=0.5)
-                    distance = face_recognition.face_distance([known_encodings[0]], live_encoding)
-                    
-                    confidence = 1 - float(distance[0])
-
-                    if match[0]:
-                        is_match = True
-                        if confidence > best_match_confidence:
-                            best_match_confidence = confidence
-            except:
-                continue # Skip bad known images
-
-        if checked_count == 0:
+        if len(member_paths) == 0:
              return {"success": False, "error": "No valid reference photos found for this card"}
 
+        # Compare against every member in one vectorized distance computation
+        distances = face_recognition.face_distance(member_encodings, live_encoding)
+        best = int(np.argmin(distances))
+        is_match = bool(distances[best] <= MATCH_TOLERANCE)
+
         if is_match:
             return {
                 "success": True, 
                 "match": True, 
-                "confidence": best_match_confidence 
+                "confidence": 1 - float(distances[best]),
+                "member_index": known_image_paths.index(member_paths[best]),
+                "member_path": member_paths[best]
             }
         else:
              return {
                 "success": True, # Process succeeded, but no match
                 "match": False, 
-                "confidence": best_match_confidence,
+                "confidence": 0.0,
                 "error": "Face does not match any family member"
             }
 
@@ -78,13 +162,21 @@ def verify_face(live_image_path, known_image_paths):
         return {"success": False, "error": str(e)}
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        # Expect at least: script.py <live_path> <known_path_1>
-        print(json.dumps({"success": False, "error": "Usage: python face_auth.py <live_path> <known_path_1> [known_path_2 ...]"}) )
+    args = sys.argv[1:]
+
+    # Optional: --card <card_id> keeps the family's encodings on disk between calls
+    card_id = None
+    if len(args) >= 2 and args[0] == "--card":
+        card_id = args[1]
+        args = args[2:]
+
+    if len(args) < 2:
+        # Expect at least: script.py [--card <card_id>] <live_path> <known_path_1>
+        print(json.dumps({"success": False, "error": "Usage: python face_auth.py [--card <card_id>] <live_path> <known_path_1> [known_path_2 ...]"}) )
         sys.exit(1)
 
-    live_path = sys.argv[1]
-    known_paths = sys.argv[2:] # All remaining args are known paths
+    live_path = args[0]
+    known_paths = args[1:] # All remaining args are known paths
     
-    result = verify_face(live_path, known_paths)
+    result = verify_face(live_path, known_paths, card_id)
     print(json.dumps(result))
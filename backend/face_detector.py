@@ -0,0 +1,92 @@
+import os
+import cv2
+import numpy as np
+from image_utils import downscale_for_detection
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
+# Downloaded by download_yunet.py
+YUNET_PATH = os.path.join(MODELS_DIR, "face_detection_yunet_2023mar.onnx")
+
+def align_to_eyes(img: np.ndarray, eye_a, eye_b) -> np.ndarray:
+    """Rotate the image so the line between the two eye centers is level."""
+    angle = np.degrees(np.arctan2(eye_b[1] - eye_a[1], eye_b[0] - eye_a[0]))
+    center = (float((eye_a[0] + eye_b[0]) / 2), float((eye_a[1] + eye_b[1]) / 2))
+    matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+    return cv2.warpAffine(img, matrix, (img.shape[1], img.shape[0]), borderMode=cv2.BORDER_REPLICATE)
+
+def aligned_crop(img: np.ndarray, x: int, y: int, w: int, h: int, eye_a, eye_b) -> np.ndarray:
+    """
+    The (x, y, w, h) box of the eye-aligned image, the same pixels align_to_eyes would
+    give, but only a padded region around the face is rotated. The rotation is about
+    the eye midpoint inside the box, so a margin of the box diagonal covers every
+    source pixel the crop can sample.
+    """
+    height, width = img.shape[:2]
+    pad = int(np.ceil(np.hypot(w, h)))
+    left, top = max(0, x - pad), max(0, y - pad)
+    right, bottom = min(width, x + w + pad), min(height, y + h + pad)
+    region = align_to_eyes(
+        img[top:bottom, left:right],
+        (eye_a[0] - left, eye_a[1] - top),
+        (eye_b[0] - left, eye_b[1] - top)
+    )
+    return region[y - top:y - top + h, x - left:x - left + w]
+
+class YuNetDetector:
+    """
+    ONNX face detector (YuNet) run through OpenCV's DNN module, so detection does
+    not need TensorFlow. Faces come back in the DeepFace.extract_faces format:
+    an eye-aligned RGB crop in [0, 1], its facial_area and confidence.
+    """
+
+    def __init__(self, model_path: str = YUNET_PATH, score_threshold: float = 0.8, nms_threshold: float = 0.3):
+        self.model_path = model_path
+        self.score_threshold = score_threshold
+        self.nms_threshold = nms_threshold
+        self.detector = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold, nms_threshold, 5000)
+
+    @staticmethod
+    def available() -> bool:
+        return os.path.exists(YUNET_PATH)
+
+    def _align(self, img: np.ndarray, det: np.ndarray, x: int, y: int, w: int, h: int) -> np.ndarray:
+        """Eye-aligned crop of the box (landmarks 0 and 1 are the eyes)."""
+        return aligned_crop(img, x, y, w, h, det[4:6], det[6:8])
+
+    def extract_faces(self, img: np.ndarray, align: bool = True, max_side=None):
+        """
+        Detect faces in a BGR frame. Like DeepFace with enforce_detection=False, the
+        whole frame is returned as a single face when nothing is detected.
+        With max_side, detection runs on a downscaled copy and the boxes and
+        landmarks are mapped back, so crops still come from the full-size frame.
+        """
+        height, width = img.shape[:2]
+        small, scale = downscale_for_detection(img, max_side)
+        self.detector.setInputSize((small.shape[1], small.shape[0]))
+        _, detections = self.detector.detect(small)
+        if detections is not None and scale != 1.0:
+            detections = detections.copy()
+            detections[:, :14] /= scale  # Box and the five landmarks; the score stays
+
+        faces = []
+        for det in (detections if detections is not None else []):
+            x, y, w, h = [int(round(v)) for v in det[:4]]
+            x, y = max(0, x), max(0, y)
+            w, h = min(w, width - x), min(h, height - y)
+            if w <= 0 or h <= 0:
+                continue
+
+            crop = self._align(img, det, x, y, w, h) if align else img[y:y + h, x:x + w]
+            faces.append({
+                "face": crop[:, :, ::-1].astype(np.float32) / 255.0,
+                "facial_area": {"x": x, "y": y, "w": w, "h": h},
+                "confidence": float(det[-1])
+            })
+
+        if not faces:
+            faces.append({
+                "face": img[:, :, ::-1].astype(np.float32) / 255.0,
+                "facial_area": {"x": 0, "y": 0, "w": width, "h": height},
+                "confidence": 0
+            })
+        return faces
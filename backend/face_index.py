@@ -0,0 +1,354 @@
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
+import numpy as np
+
+# Shops with more faces than this switch from exact search to the IVF index
+IVF_THRESHOLD = 5000
+
+
+def _normalize(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """L2-normalise rows so inner product equals cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, dim)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _reserve(buffer: np.ndarray, size: int) -> np.ndarray:
+    """buffer with room for at least size rows, doubling capacity when it is full."""
+    if size <= len(buffer):
+        return buffer
+    grown = np.zeros((max(size, 2 * len(buffer), 16),) + buffer.shape[1:], dtype=buffer.dtype)
+    grown[:len(buffer)] = buffer
+    return grown
+
+
+class FaceIndex:
+    """
+    Flat inner-product index of L2-normalised face embeddings.
+    Search is exact and compares the query against every enrolled face, which is
+    the fastest option for the few hundred to few thousand faces of one shop.
+    Rows live in a buffer whose capacity doubles, so adding a face is amortised O(1).
+    """
+    kind = "flat"
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.ids: List[str] = []
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._rows: Dict[str, int] = {}
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """(n_faces, dim) view of the enrolled embeddings."""
+        return self._vectors[:len(self.ids)]
+
+    @vectors.setter
+    def vectors(self, vectors: np.ndarray) -> None:
+        self._vectors = vectors
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, face_id: str) -> bool:
+        return face_id in self._rows
+
+    def add(self, face_id: str, embedding: np.ndarray) -> None:
+        """Add a face, or replace its embedding if the id is already enrolled."""
+        vector = _normalize(embedding, self.dim)
+        row = self._rows.get(face_id)
+        if row is not None:
+            self.vectors[row] = vector[0]
+            self._moved(row)
+            return
+
+        row = len(self.ids)
+        self._vectors = _reserve(self._vectors, row + 1)
+        self._vectors[row] = vector[0]
+        self._rows[face_id] = row
+        self.ids.append(face_id)
+        self._moved(row)
+
+    def add_many(self, faces: Iterable[Tuple[str, np.ndarray]]) -> None:
+        """Add (face_id, embedding) pairs, e.g. a whole shop during a rebuild."""
+        for face_id, embedding in faces:
+            self.add(face_id, embedding)
+
+    def remove(self, face_id: str) -> bool:
+        """Remove a face by id. The last row is moved into the hole, so this is O(1)."""
+        row = self._rows.pop(face_id, None)
+        if row is None:
+            return False
+
+        last = len(self.ids) - 1
+        if row != last:
+            moved_id = self.ids[last]
+            self.ids[row] = moved_id
+            self.vectors[row] = self.vectors[last]
+            self._rows[moved_id] = row
+            self._swap(row, last)
+
+        self.ids.pop()
+        return True
+
+    def remove_where(self, predicate: Callable[[str], bool]) -> int:
+        """Remove every face whose id matches predicate. Returns how many were removed."""
+        doomed = [face_id for face_id in self.ids if predicate(face_id)]
+        for face_id in doomed:
+            self.remove(face_id)
+        return len(doomed)
+
+    def search(self, embedding: np.ndarray, k: int = 5) -> List[Tuple[str, float]]:
+        """Return up to k (face_id, cosine_similarity) pairs, most similar first."""
+        if not self.ids:
+            return []
+
+        query = _normalize(embedding, self.dim)[0]
+        rows = self._candidates(query)
+        if rows is None:
+            scores = self.vectors @ query
+            rows = np.arange(len(self.ids))
+        else:
+            scores = self.vectors[rows] @ query
+
+        k = min(k, len(rows))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[rows[i]], float(scores[i])) for i in top]
+
+    # Hooks for subclasses that keep extra per-row state
+    def _candidates(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """Rows worth scoring for query, or None for all of them."""
+        return None
+
+    def _moved(self, row: int) -> None:
+        pass
+
+    def _swap(self, row: int, last: int) -> None:
+        pass
+
+    def _extra_arrays(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def _restore(self, stored) -> None:
+        pass
+
+    def save(self, path: str) -> None:
+        """Write the index atomically, so readers in other workers never see a partial file."""
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            kind=np.array(self.kind),
+            ids=np.array(self.ids, dtype=str).reshape(-1),
+            vectors=self.vectors,
+            **self._extra_arrays()
+        )
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path: str) -> "FaceIndex":
+        with np.load(path) as stored:
+            kind = str(stored["kind"])
+            vectors = stored["vectors"].astype(np.float32)
+            index = IVFFaceIndex(vectors.shape[1]) if kind == IVFFaceIndex.kind else FaceIndex(vectors.shape[1])
+            index.ids = [str(face_id) for face_id in stored["ids"]]
+            index.vectors = vectors
+            index._rows = {face_id: row for row, face_id in enumerate(index.ids)}
+            index._restore(stored)
+        return index
+
+
+class IVFFaceIndex(FaceIndex):
+    """
+    Inverted-file index for district-scale shops. Faces are clustered around
+    k-means centroids and a query only scores the faces of its nprobe closest
+    clusters, trading a little recall for far fewer dot products. Clusters are
+    retrained whenever the index has doubled since the last training.
+    """
+    kind = "ivf"
+
+    def __init__(self, dim: int = 512, nprobe: int = 8):
+        super().__init__(dim)
+        self.nprobe = nprobe
+        self.centroids = np.zeros((0, dim), dtype=np.float32)
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self.trained_size = 0
+
+    @property
+    def assignments(self) -> np.ndarray:
+        """Cluster of every enrolled face (empty until trained)."""
+        return self._assignments[:len(self.ids)]
+
+    @assignments.setter
+    def assignments(self, assignments: np.ndarray) -> None:
+        self._assignments = assignments
+
+    def train(self, iterations: int = 10, seed: int = 0) -> None:
+        """Spherical k-means over (a sample of) the enrolled faces."""
+        n = len(self.ids)
+        if n == 0:
+            return
+
+        n_lists = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        sample = self.vectors[rng.choice(n, size=min(n, n_lists * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)]
+
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = _normalize(centroids, self.dim)
+
+        self.centroids = centroids
+        self.assignments = np.argmax(self.vectors @ centroids.T, axis=1).astype(np.int32)
+        self.trained_size = n
+
+    def _candidates(self, query: np.ndarray) -> Optional[np.ndarray]:
+        if len(self.centroids) == 0:
+            return None
+        nprobe = min(self.nprobe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.flatnonzero(np.isin(self.assignments, probe))
+
+    def _moved(self, row: int) -> None:
+        if len(self.centroids) == 0:
+            return
+        if len(self.ids) >= 2 * self.trained_size:
+            self.train()
+            return
+        cluster = int(np.argmax(self.centroids @ self.vectors[row]))
+        self._assignments = _reserve(self._assignments, row + 1)
+        self._assignments[row] = cluster
+
+    def _swap(self, row: int, last: int) -> None:
+        if len(self.centroids):
+            self._assignments[row] = self._assignments[last]
+
+    def _extra_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            "centroids": self.centroids,
+            "assignments": self.assignments,
+            "trained_size": np.array(self.trained_size)
+        }
+
+    def _restore(self, stored) -> None:
+        self.centroids = stored["centroids"].astype(np.float32)
+        self.assignments = stored["assignments"].astype(np.int32)
+        self.trained_size = int(stored["trained_size"])
+
+
+class ShopIndexStore:
+    """
+    One face index per shop, each persisted as <directory>/<shop>.npz.
+    Files are reloaded when another worker process has rewritten them, and a shop
+    is promoted from the flat index to IVF once it grows past IVF_THRESHOLD.
+    Changes hold an exclusive lock on <shop>.npz.lock for the whole load/modify/save,
+    so workers of a FACE_WORKERS pool never overwrite each other's enrollments.
+    """
+
+    def __init__(self, directory: str, dim: int = 512):
+        self.directory = directory
+        self.dim = dim
+        self._indexes: Dict[str, Tuple[FaceIndex, Optional[Tuple[int, int]]]] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, shop: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]", "_", shop) + ".npz")
+
+    @staticmethod
+    def _version(path: str) -> Optional[Tuple[int, int]]:
+        """(mtime_ns, size) of the shop file, or None if it does not exist yet."""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @contextmanager
+    def _writing(self, shop: str):
+        """Exclusive access to one shop's file, across threads and worker processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._path(shop) + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _get(self, shop: str) -> FaceIndex:
+        path = self._path(shop)
+        version = self._version(path)
+        cached = self._indexes.get(shop)
+        if cached is not None and cached[1] == version:
+            return cached[0]
+
+        index = FaceIndex.load(path) if version is not None else FaceIndex(self.dim)
+        self._indexes[shop] = (index, version)
+        return index
+
+    def _save(self, shop: str, index: FaceIndex) -> None:
+        path = self._path(shop)
+        index.save(path)
+        self._indexes[shop] = (index, self._version(path))
+
+    def _promote(self, index: FaceIndex) -> FaceIndex:
+        """Switch a shop that outgrew exact search to the IVF index."""
+        if index.kind != FaceIndex.kind or len(index) <= IVF_THRESHOLD:
+            return index
+        promoted = IVFFaceIndex(self.dim)
+        promoted.ids, promoted.vectors, promoted._rows = index.ids, index._vectors, index._rows
+        promoted.train()
+        return promoted
+
+    def shops(self) -> List[str]:
+        return sorted(name[:-len(".npz")] for name in os.listdir(self.directory)
+                      if name.endswith(".npz") and not name.endswith(".tmp.npz"))
+
+    def add(self, shop: str, face_id: str, embedding: np.ndarray) -> int:
+        """Enroll (or re-enroll) a face in a shop. Returns the shop's index size."""
+        return self.add_many(shop, [(face_id, embedding)])
+
+    def add_many(self, shop: str, faces: List[Tuple[str, np.ndarray]], replace: bool = False) -> int:
+        """
+        Enroll many faces in a shop and write its file once. With replace the shop's
+        index is rebuilt from just these faces. Returns the shop's index size.
+        """
+        with self._writing(shop):
+            index = FaceIndex(self.dim) if replace else self._get(shop)
+            index.add_many(faces)
+            index = self._promote(index)
+            self._save(shop, index)
+            return len(index)
+
+    def remove(self, shop: Optional[str], predicate: Callable[[str], bool]) -> int:
+        """Remove matching faces from one shop, or from every shop when shop is None."""
+        removed = 0
+        for name in ([shop] if shop else self.shops()):
+            with self._writing(name):
+                index = self._get(name)
+                count = index.remove_where(predicate)
+                if count:
+                    self._save(name, index)
+                    removed += count
+        return removed
+
+    def search(self, shop: str, embedding: np.ndarray, k: int = 5) -> List[Tuple[str, float]]:
+        with self._lock:
+            return self._get(shop).search(embedding, k)
@@ -0,0 +1,87 @@
+import sys
+import json
+import time
+
+# Persistent worker for the face_recognition (dlib) scripts. face_recognition and
+# its models are imported and warmed up once; requests then arrive as JSON lines
+# on stdin and each gets one JSON line on stdout, with its "id" echoed:
+#   {"id": 1, "op": "check_face", "stored_path": "...", "live_path": "..."}
+#   {"id": 2, "op": "verify_face", "live_path": "...", "known_paths": ["..."], "card_id": "..."}
+#   {"id": 3, "op": "verify", "live_file": "...", "ref_files": ["..."]}
+#   {"id": 4, "batch": [{"op": ...}, {"op": ...}]}  -> {"id": 4, "results": [...]}
+START_TIME = time.perf_counter()
+
+# Keep the real stdout for JSON; anything the libraries print goes to stderr
+real_stdout = sys.stdout
+sys.stdout = sys.stderr
+
+import numpy as np
+import face_recognition
+from simple_face_check import check_face
+from face_auth import verify_face
+from verify_face import verify
+from image_utils import EARLY_EXIT_DISTANCE, REF_WORKERS, REF_POOL
+
+def handle_check_face(data):
+    return check_face(data["stored_path"], data["live_path"])
+
+def scan_options(data):
+    """Per-request early exit / reference pool settings, defaulting to the environment."""
+    return (data.get("early_exit", EARLY_EXIT_DISTANCE), int(data.get("workers", REF_WORKERS)),
+            data.get("pool", REF_POOL))
+
+def handle_verify_face(data):
+    return verify_face(data["live_path"], data.get("known_paths", []), data.get("card_id"), *scan_options(data))
+
+def handle_verify(data):
+    return verify(data["live_file"], data.get("ref_files", []), *scan_options(data))
+
+OPERATIONS = {
+    "check_face": handle_check_face,
+    "verify_face": handle_verify_face,
+    "verify": handle_verify
+}
+
+def process_request(data):
+    if not isinstance(data, dict):
+        return {"success": False, "error": "Request must be a JSON object"}
+    if "batch" in data:
+        return {"success": True, "results": [process_request(item) for item in data["batch"]]}
+
+    handler = OPERATIONS.get(data.get("op"))
+    if handler is None:
+        return {"success": False, "error": f"Unknown op: {data.get('op')}"}
+    try:
+        return handler(data)
+    except KeyError as e:
+        return {"success": False, "error": f"Missing field: {e}"}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+def write_response(response, data=None):
+    """Write one JSON response to the REAL stdout, echoing the request id if one was sent."""
+    if isinstance(data, dict) and "id" in data:
+        response["id"] = data["id"]
+    real_stdout.write(json.dumps(response) + "\n")
+    real_stdout.flush()
+
+def main():
+    # Run the detector and encoder once so the first real request is not the slow one
+    warmup = np.zeros((64, 64, 3), dtype=np.uint8)
+    face_recognition.face_locations(warmup)
+    face_recognition.face_encodings(warmup, known_face_locations=[(8, 56, 56, 8)])
+    write_response({"status": "ready", "message": f"face_recognition ready in {time.perf_counter() - START_TIME:.2f}s"})
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            write_response({"success": False, "error": "Invalid JSON input"})
+            continue
+        write_response(process_request(data), data)
+
+if __name__ == "__main__":
+    main()
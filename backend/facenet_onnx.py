@@ -0,0 +1,77 @@
+import os
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
+# Produced once by export_facenet_onnx.py (--int8 adds the quantized variant)
+FACENET_ONNX_PATH = os.path.join(MODELS_DIR, "facenet512.onnx")
+FACENET_INT8_PATH = os.path.join(MODELS_DIR, "facenet512.int8.onnx")
+
+def model_paths(int8: bool = False):
+    """(model, optimized graph) paths. ONNX Runtime's optimized graph is saved next to
+    the model so later starts can skip graph optimization."""
+    model_path = FACENET_INT8_PATH if int8 else FACENET_ONNX_PATH
+    return model_path, model_path[:-len(".onnx")] + ".opt.onnx"
+
+def to_model_input(face: np.ndarray, target_size) -> np.ndarray:
+    """Letterbox an RGB [0, 1] face crop to the model input size, like DeepFace does."""
+    target_h, target_w = target_size
+    h, w = face.shape[:2]
+    factor = min(target_h / h, target_w / w)
+    resized = cv2.resize(face, (max(1, int(w * factor)), max(1, int(h * factor))))
+
+    pad_h = target_h - resized.shape[0]
+    pad_w = target_w - resized.shape[1]
+    padded = np.pad(
+        resized,
+        ((pad_h // 2, pad_h - pad_h // 2), (pad_w // 2, pad_w - pad_w // 2), (0, 0)),
+        "constant"
+    )
+    if padded.shape[:2] != (target_h, target_w):
+        padded = cv2.resize(padded, (target_w, target_h))
+    return padded.astype(np.float32)
+
+class OnnxFacenet:
+    """
+    Facenet512 served by ONNX Runtime from a pre-converted model file.
+    Exposes the part of the Keras model API that deepface_service uses
+    (input_shape, output_shape, predict_on_batch), so it is a drop-in replacement.
+    Thread counts of 0 let ONNX Runtime pick; int8 selects the quantized weights.
+    """
+
+    def __init__(self, int8: bool = False, intra_op_threads: int = 0, inter_op_threads: int = 0):
+        self.int8 = int8
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+
+        model_path, optimized_path = model_paths(int8)
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        if inter_op_threads > 1:
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+
+        if os.path.exists(optimized_path):
+            # Already optimized on a previous start: load it as-is
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            path = optimized_path
+        else:
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            options.optimized_model_filepath = optimized_path
+            path = model_path
+
+        self.model_path = path
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_shape = tuple(model_input.shape)  # (batch, 160, 160, 3)
+        self.output_shape = tuple(self.session.get_outputs()[0].shape)  # (batch, 512)
+
+    @staticmethod
+    def available(int8: bool = False) -> bool:
+        return any(os.path.exists(path) for path in model_paths(int8))
+
+    def predict_on_batch(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch.astype(np.float32, copy=False)})[0]
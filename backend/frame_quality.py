@@ -0,0 +1,136 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+class FrameQualityScorer:
+    """
+    Cheap pre-check of a live frame before detection, embedding and liveness run:
+    sharpness (variance of the Laplacian over the face), face size, pose (frontal
+    cascade hit plus left/right symmetry of the face) and exposure (mean brightness
+    and clipped pixels). Everything runs on a small grayscale copy, so a frame is
+    scored in a few milliseconds.
+    """
+
+    def __init__(
+        self,
+        min_sharpness: float = 40.0,
+        good_sharpness: float = 200.0,
+        min_brightness: float = 40.0,
+        max_brightness: float = 220.0,
+        max_clipped: float = 0.25,
+        min_face_ratio: float = 0.02,
+        good_face_ratio: float = 0.12,
+        min_symmetry: float = 0.5,
+        analysis_side: int = 320
+    ):
+        self.min_sharpness = min_sharpness
+        self.good_sharpness = good_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped = max_clipped
+        self.min_face_ratio = min_face_ratio
+        self.good_face_ratio = good_face_ratio
+        self.min_symmetry = min_symmetry
+        self.analysis_side = analysis_side
+
+        # The frontal cascade ships with opencv-python; without it the whole frame is scored
+        self.cascade = None
+        cascade_dir = getattr(getattr(cv2, "data", None), "haarcascades", None)
+        if cascade_dir:
+            cascade = cv2.CascadeClassifier(cascade_dir + "haarcascade_frontalface_default.xml")
+            if not cascade.empty():
+                self.cascade = cascade
+
+    def _find_face(self, gray: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        """(x, y, w, h) of the largest frontal face on the small copy, or None."""
+        if self.cascade is None:
+            return None
+        min_side = max(16, int(min(gray.shape) * 0.1))
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=1.2, minNeighbors=4, minSize=(min_side, min_side))
+        if len(faces) == 0:
+            return None
+        return tuple(int(v) for v in max(faces, key=lambda f: f[2] * f[3]))
+
+    @staticmethod
+    def _symmetry(face: np.ndarray) -> float:
+        """1.0 for a perfectly mirror-symmetric face crop, lower as the head turns away."""
+        half = face.shape[1] // 2
+        if half < 2:
+            return 0.0
+        left = face[:, :half].astype(np.float32)
+        right = face[:, -half:][:, ::-1].astype(np.float32)
+        return float(max(0.0, 1.0 - np.mean(np.abs(left - right)) / 64.0))
+
+    def score(self, img: np.ndarray) -> Dict:
+        """
+        Quality of one BGR frame: {"score" (0..1), "usable", "reasons", "sharpness",
+        "brightness", "clipped", "face_ratio", "symmetry", "face_found"}.
+        """
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        scale = min(1.0, self.analysis_side / max(gray.shape[:2]))
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        face_box = self._find_face(gray)
+        if face_box is not None:
+            x, y, w, h = face_box
+            region = gray[y:y + h, x:x + w]
+            face_ratio = (w * h) / float(gray.shape[0] * gray.shape[1])
+            symmetry = self._symmetry(region)
+        else:
+            region = gray
+            face_ratio = 0.0
+            symmetry = 0.0
+
+        # Sharpness on the small copy: downscaling keeps real edges, so motion blur
+        # and focus misses still show up as a low Laplacian variance
+        sharpness = float(cv2.Laplacian(region, cv2.CV_64F).var())
+        brightness = float(region.mean())
+        clipped = float(np.count_nonzero((region <= 5) | (region >= 250)) / region.size)
+
+        reasons = []
+        if self.cascade is not None and face_box is None:
+            reasons.append("no_frontal_face")
+        elif self.cascade is not None and face_ratio < self.min_face_ratio:
+            reasons.append("face_too_small")
+        if sharpness < self.min_sharpness:
+            reasons.append("blurred")
+        if brightness < self.min_brightness:
+            reasons.append("too_dark")
+        elif brightness > self.max_brightness:
+            reasons.append("too_bright")
+        if clipped > self.max_clipped:
+            reasons.append("clipped")
+        if face_box is not None and symmetry < self.min_symmetry:
+            reasons.append("turned_away")
+
+        exposure = max(0.0, 1.0 - abs(brightness - 128.0) / 128.0) * (1.0 - min(1.0, clipped))
+        terms = [min(1.0, sharpness / self.good_sharpness), exposure]
+        if face_box is not None:
+            terms += [min(1.0, face_ratio / self.good_face_ratio), max(0.1, symmetry)]
+        elif self.cascade is not None:
+            # Penalised but not zeroed, so frames the cascade misses still rank by sharpness and exposure
+            terms.append(0.1)
+
+        return {
+            "score": float(np.prod(terms)),
+            "usable": not reasons,
+            "reasons": reasons,
+            "sharpness": sharpness,
+            "brightness": brightness,
+            "clipped": clipped,
+            "face_ratio": face_ratio,
+            "symmetry": symmetry,
+            "face_found": face_box is not None
+        }
+
+    def rank(self, frames: Sequence[np.ndarray], usable_first: bool = False) -> List[Tuple[int, Dict]]:
+        """
+        (index, quality) for every frame, best score first. With usable_first, frames
+        that pass every check rank above those that do not, whatever their score.
+        """
+        scored = [(i, self.score(frame)) for i, frame in enumerate(frames)]
+        if usable_first:
+            return sorted(scored, key=lambda item: (item[1]["usable"], item[1]["score"]), reverse=True)
+        return sorted(scored, key=lambda item: item[1]["score"], reverse=True)
@@ -0,0 +1,255 @@
+import binascii
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from io import BytesIO
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# Faces are detected on a copy no larger than this (longest side, pixels); boxes are
+# then mapped back and faces are cropped/encoded from the original. 0 disables it.
+try:
+    DETECT_MAX_SIDE = int(os.environ.get('FACE_DETECT_MAX_SIDE', 640))
+except ValueError:
+    DETECT_MAX_SIDE = 640
+
+# Reference photo scanning: stop as soon as one matches within FACE_EARLY_EXIT_DISTANCE
+# (unset = always compare every photo; never looser than the match tolerance), and
+# decode/encode uncached photos on FACE_REF_WORKERS threads, or processes with
+# FACE_REF_POOL=process, once there are at least FACE_REF_PARALLEL_MIN of them
+try:
+    EARLY_EXIT_DISTANCE = float(os.environ['FACE_EARLY_EXIT_DISTANCE']) if os.environ.get('FACE_EARLY_EXIT_DISTANCE') else None
+except ValueError:
+    EARLY_EXIT_DISTANCE = None
+try:
+    REF_WORKERS = max(1, int(os.environ.get('FACE_REF_WORKERS', 1)))
+except ValueError:
+    REF_WORKERS = 1
+REF_POOL = os.environ.get('FACE_REF_POOL', 'thread').lower()
+try:
+    REF_PARALLEL_MIN = max(2, int(os.environ.get('FACE_REF_PARALLEL_MIN', 4)))
+except ValueError:
+    REF_PARALLEL_MIN = 4
+
+# Leading bytes of the image formats PIL is asked to decode
+MAGIC_NUMBERS = {
+    b"\xff\xd8\xff": "jpeg",
+    b"\x89PNG\r\n\x1a\n": "png",
+    b"GIF8": "gif",
+    b"BM": "bmp",
+    b"RIFF": "webp",
+}
+
+# Base64 alphabet characters are ASCII; everything else in the text is whitespace
+_WHITESPACE = b" \t\r\n"
+_CHUNK_SIZE = 1 << 16  # Bytes of base64 text read at a time
+
+# Decoded bytes of the last reference, reused so each call does not grow a new
+# buffer (one per thread, so references can be decoded in parallel)
+_local = threading.local()
+
+# Reference pools, created on first use and kept for the life of the process
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """Image format from the first bytes of encoded data, or None if it is not an image."""
+    for magic, name in MAGIC_NUMBERS.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def decode_image_bytes(data, max_side: Optional[int] = None) -> Optional[np.ndarray]:
+    """
+    Encoded image bytes -> RGB uint8 array. With max_side, JPEGs much larger than
+    that are decoded at 1/2, 1/4 or 1/8 scale by libjpeg itself (draft mode), which
+    skips most of the decoding work for phone-camera photos.
+    """
+    # PIL is only needed here; the detection helpers below work without it
+    from PIL import Image
+    try:
+        image = Image.open(BytesIO(data))
+        if max_side and image.format == "JPEG" and max(image.size) > 2 * max_side:
+            scale = max_side / max(image.size)
+            image.draft("RGB", (int(image.size[0] * scale), int(image.size[1] * scale)))
+        return np.asarray(image.convert("RGB"))
+    except Exception:
+        return None
+
+
+def _decode_base64_stream(f, first: bytes) -> bytearray:
+    """Decode base64 text from a binary file in chunks into this thread's buffer."""
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None:
+        buffer = _local.buffer = bytearray()
+    del buffer[:]
+
+    carry = b""
+    chunk = first
+    while chunk:
+        # Decode whole 4-character groups; the remainder waits for the next chunk
+        text = carry + chunk.translate(None, _WHITESPACE)
+        usable = len(text) - len(text) % 4
+        buffer += binascii.a2b_base64(text[:usable])
+        carry = text[usable:]
+        chunk = f.read(_CHUNK_SIZE)
+    if carry:
+        # Tolerate missing padding, like base64.b64decode callers usually did
+        buffer += binascii.a2b_base64(carry + b"=" * (-len(carry) % 4))
+    return buffer
+
+
+def load_image_text(path: str, max_side: Optional[int] = None) -> Optional[np.ndarray]:
+    """
+    Load a reference stored as a text file: a path to an image, a base64 string,
+    or a data URI. The file is read in binary chunks and never held as one Python
+    string; the format is sniffed from the first decoded bytes. A file that turns
+    out to be a raw image is decoded as-is. Returns an RGB array or None.
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(_CHUNK_SIZE)
+
+            if sniff_format(head):
+                return decode_image_bytes(head + f.read(), max_side)
+
+            stripped = head.lstrip()
+            if stripped.startswith(b"data:"):
+                # data:image/jpeg;base64,<payload>
+                comma = stripped.find(b",")
+                if comma < 0:
+                    return None
+                stripped = stripped[comma + 1:]
+            elif os.path.getsize(path) < 4096:
+                # Short content may be a path to the actual image file
+                candidate = head.strip().decode("utf-8", errors="ignore")
+                if candidate and os.path.isfile(candidate):
+                    with open(candidate, "rb") as image_file:
+                        return decode_image_bytes(image_file.read(), max_side)
+
+            data = _decode_base64_stream(f, stripped)
+            if not sniff_format(bytes(data[:8])):
+                return None
+            return decode_image_bytes(data, max_side)
+    except (OSError, binascii.Error, ValueError):
+        return None
+
+
+def load_image_string(content: str, max_side: Optional[int] = None) -> Optional[np.ndarray]:
+    """Same as load_image_text for content that is already in memory."""
+    content = content.strip()
+    if len(content) < 4096 and os.path.isfile(content):
+        with open(content, "rb") as image_file:
+            return decode_image_bytes(image_file.read(), max_side)
+
+    if content.startswith("data:"):
+        content = content[content.find(",") + 1:]
+    try:
+        data = binascii.a2b_base64(content + "=" * (-len(content) % 4))
+    except (binascii.Error, ValueError):
+        return None
+    if not sniff_format(data[:8]):
+        return None
+    return decode_image_bytes(data, max_side)
+
+
+def downscale_for_detection(image: np.ndarray, max_side: Optional[int] = DETECT_MAX_SIDE) -> Tuple[np.ndarray, float]:
+    """
+    (copy for the face detector, scale) where scale = detector size / original size.
+    Images already within max_side are returned as-is with scale 1.0.
+    """
+    longest = max(image.shape[:2])
+    if not max_side or longest <= max_side:
+        return image, 1.0
+    scale = max_side / longest
+    size = (max(1, int(round(image.shape[1] * scale))), max(1, int(round(image.shape[0] * scale))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+
+def scale_locations(locations: List[Tuple[int, int, int, int]], scale: float, shape) -> List[Tuple[int, int, int, int]]:
+    """Map face_recognition (top, right, bottom, left) boxes from the detector copy back to the original."""
+    if scale == 1.0:
+        return list(locations)
+    height, width = shape[:2]
+    return [
+        (
+            max(0, int(top / scale)),
+            min(width, int(round(right / scale))),
+            min(height, int(round(bottom / scale))),
+            max(0, int(left / scale))
+        )
+        for top, right, bottom, left in locations
+    ]
+
+
+def face_encodings_downscaled(
+    image: np.ndarray,
+    max_side: Optional[int] = DETECT_MAX_SIDE,
+    num_jitters: int = 1,
+    model: str = "small",
+    detection_model: str = "hog"
+):
+    """
+    face_recognition.face_encodings with detection on a downscaled copy: the faces
+    are located on the small image and encoded from the full-resolution original,
+    so embedding quality is unchanged. Falls back to full-resolution detection if
+    the small copy shows no face (e.g. a tiny face in a huge photo).
+    """
+    import face_recognition
+
+    small, scale = downscale_for_detection(image, max_side)
+    locations = face_recognition.face_locations(small, model=detection_model)
+    if not locations and scale != 1.0:
+        scale = 1.0
+        locations = face_recognition.face_locations(image, model=detection_model)
+    if not locations:
+        return []
+    return face_recognition.face_encodings(
+        image,
+        known_face_locations=scale_locations(locations, scale, image.shape),
+        num_jitters=num_jitters,
+        model=model
+    )
+
+
+def early_exit_distance(early_exit: Optional[float], tolerance: float) -> Optional[float]:
+    """The early-exit distance clamped to the match tolerance, so scanning only stops on a match."""
+    return None if early_exit is None else min(early_exit, tolerance)
+
+
+def _executor(workers: int, pool: str):
+    """Shared thread/process pool, so its start-up cost is paid once per process."""
+    key = ("process" if pool == "process" else "thread", workers)
+    with _executors_lock:
+        executor = _executors.get(key)
+        if executor is None:
+            executor_class = ProcessPoolExecutor if key[0] == "process" else ThreadPoolExecutor
+            executor = _executors[key] = executor_class(max_workers=workers)
+        return executor
+
+
+def map_references(work: Callable, items: Sequence, workers: int = 1, pool: str = "thread") -> Iterator[Tuple[int, object]]:
+    """
+    Yield (index, work(item)) for every reference. With workers > 1 and at least
+    REF_PARALLEL_MIN items, they are processed on a shared thread (or process) pool
+    and yielded as they finish; fewer items are cheaper to process inline. Breaking
+    out of the loop cancels whatever has not started yet, so callers can stop at the
+    first confident match. work must be a module-level function for process pools.
+    """
+    if workers <= 1 or len(items) < REF_PARALLEL_MIN:
+        for index, item in enumerate(items):
+            yield index, work(item)
+        return
+
+    executor = _executor(workers, pool)
+    futures = {executor.submit(work, item): index for index, item in enumerate(items)}
+    try:
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        for future in futures:
+            future.cancel()
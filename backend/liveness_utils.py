@@ -3,18 +3,54 @@ import numpy as np
 import onnxruntime as ort
 from typing import List, Dict, Tuple
 
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
 class LivenessDetector:
-    def __init__(self, model_path: str, model_img_size: int = 128, threshold: float = 0.5):
+    def __init__(
+        self,
+        model_path: str,
+        model_img_size: int = 128,
+        threshold: float = 0.5,
+        graph_optimization: str = "all",
+        intra_op_threads: int = 0,
+        inter_op_threads: int = 0,
+        enable_mem_arena: bool = True,
+        use_io_binding: bool = False
+    ):
         self.model_path = model_path
         self.model_img_size = model_img_size
         self.threshold = threshold
+        self.graph_optimization = graph_optimization
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.enable_mem_arena = enable_mem_arena
+        self.use_io_binding = use_io_binding
         
-        # Load ONNX session
+        # Load ONNX session (thread counts of 0 let ONNX Runtime decide)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS.get(graph_optimization, ort.GraphOptimizationLevel.ORT_ENABLE_ALL)
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.enable_cpu_mem_arena = enable_mem_arena
         self.session = ort.InferenceSession(
             model_path,
+            sess_options=options,
             providers=["CPUExecutionProvider"]
         )
-        self.input_name = self.session.get_inputs()[0].name
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.output_name = self.session.get_outputs()[0].name
+
+        # Preallocated single-crop input tensor, reused across calls. Crops are never
+        # batched: this model's scores for a crop change with the other crops in the
+        # batch, so one person's verdict would depend on unrelated requests
+        self._input_buffer = np.zeros((1, 3, model_img_size, model_img_size), dtype=np.float32)
+        self._io_binding = self.session.io_binding() if use_io_binding else None
         
         # Sigmoid threshold for logit comparison (converts probability to logit)
         p = max(1e-6, min(1 - 1e-6, threshold))
@@ -63,41 +99,78 @@ class LivenessDetector:
         
         return cv2.resize(result, (self.model_img_size, self.model_img_size), interpolation=cv2.INTER_AREA)
 
-    def _preprocess(self, face_crop: np.ndarray) -> np.ndarray:
-        """Normalize to [0,1], convert to CHW and add batch dimension."""
-        img = face_crop.transpose(2, 0, 1).astype(np.float32) / 255.0
-        return np.expand_dims(img, axis=0)
+    def _preprocess(self, face_crop: np.ndarray, out: np.ndarray) -> None:
+        """Convert a BGR crop to RGB, normalize to [0,1] and write it as CHW into out."""
+        # Convert BGR to RGB as models are usually trained on RGB (only the small crop)
+        rgb = cv2.cvtColor(face_crop, cv2.COLOR_BGR2RGB)
+        np.multiply(rgb.transpose(2, 0, 1), 1.0 / 255.0, out=out, casting="unsafe")
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        """Run the model on a (1, 3, S, S) input, returning (1, 2) logits."""
+        if self._io_binding is not None:
+            self._io_binding.bind_cpu_input(self.input_name, batch)
+            self._io_binding.bind_output(self.output_name)
+            self.session.run_with_iobinding(self._io_binding)
+            return self._io_binding.copy_outputs_to_cpu()[0]
+
+        return self.session.run([self.output_name], {self.input_name: batch})[0]
+
+    def _result(self, logits: np.ndarray) -> Dict:
+        real_logit = float(logits[0])
+        spoof_logit = float(logits[1])
+        logit_diff = real_logit - spoof_logit
+        
+        is_real = logit_diff >= self.logit_threshold
+        
+        return {
+            "is_liveness": bool(is_real),
+            "liveness_score": float(logit_diff),
+            "liveness_status": "real" if is_real else "spoof"
+        }
+
+    def detect_liveness_batch(
+        self,
+        frames: List[np.ndarray],
+        bboxes: List[Tuple[int, int, int, int]]
+    ) -> List[Dict]:
+        """
+        Predict real/fake for one face per frame. frames: BGR images; bboxes:
+        (x1, y1, x2, y2) of the face in each frame. Faces are cropped first and only
+        the crops are color converted. Each crop is run on its own (see __init__), so
+        a result never depends on the other frames passed in.
+        """
+        results: List[Dict] = [None] * len(frames)
+        valid = []
+
+        for i, (frame, bbox) in enumerate(zip(frames, bboxes)):
+            try:
+                valid.append((i, self._crop_face(frame, bbox)))
+            except Exception as e:
+                results[i] = {
+                    "is_liveness": False,
+                    "error": str(e),
+                    "liveness_status": "error"
+                }
+
+        for i, crop in valid:
+            try:
+                self._preprocess(crop, self._input_buffer[0])
+
+                # Inference
+                logits = self._run(self._input_buffer) # (1, 2) - [real_logit, spoof_logit]
+                results[i] = self._result(logits[0])
+            except Exception as e:
+                results[i] = {
+                    "is_liveness": False,
+                    "error": str(e),
+                    "liveness_status": "error"
+                }
+
+        return results
 
     def detect_liveness(self, img_bgr: np.ndarray, face_bbox_xyxy: Tuple[int, int, int, int]) -> Dict:
         """
         Predict if face is real or fake.
         face_bbox_xyxy: (x1, y1, x2, y2)
         """
-        # Convert BGR to RGB as models are usually trained on RGB
-        img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-        
-        try:
-            face_crop = self._crop_face(img_rgb, face_bbox_xyxy)
-            input_tensor = self._preprocess(face_crop)
-            
-            # Inference
-            outputs = self.session.run([], {self.input_name: input_tensor})
-            logits = outputs[0][0] # (2,) - [real_logit, spoof_logit]
-            
-            real_logit = float(logits[0])
-            spoof_logit = float(logits[1])
-            logit_diff = real_logit - spoof_logit
-            
-            is_real = logit_diff >= self.logit_threshold
-            
-            return {
-                "is_liveness": bool(is_real),
-                "liveness_score": float(logit_diff),
-                "liveness_status": "real" if is_real else "spoof"
-            }
-        except Exception as e:
-            return {
-                "is_liveness": False,
-                "error": str(e),
-                "liveness_status": "error"
-            }
+        return self.detect_liveness_batch([img_bgr], [face_bbox_xyxy])[0]
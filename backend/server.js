@@ -25,6 +25,7 @@ const io = new Server(httpServer, {
 
 // Setup Socket.IO event emitter for both hardware services
 const hardwareEventEmitter = (event, data) => {
+    trackDispensing(event);
     io.emit(event, data);
     console.log(`[Socket.IO] Emitted: ${event}`, data);
 };
@@ -264,8 +265,11 @@ app.post('/api/chat', async (req, res) => {
 class FaceService {
     constructor() {
         this.process = null;
-        this.queue = []; // FIFO Queue for pending requests
+        this.pending = new Map(); // Pending requests keyed by request id (replies may arrive out of order)
+        this.nextId = 1;
         this.buffer = ''; // Buffer for incoming data
+        // A request that gets no reply in time is rejected, so a stuck worker never hangs a route
+        this.timeoutMs = parseInt(process.env.FACE_REQUEST_TIMEOUT_MS, 10) || 30000;
         this.start();
     }
 
@@ -280,6 +284,14 @@ class FaceService {
         this.process.stderr.on('data', (data) => console.error(`[FaceService STDERR] ${data}`));
 
         this.process.on('close', (code) => {
+            // Requests sent to the dead process will never be answered
+            for (const pending of this.pending.values()) {
+                clearTimeout(pending.timer);
+                pending.reject(new Error("FaceService process exited"));
+            }
+            this.pending.clear();
+            this.buffer = '';
+
             if (code !== 0 && code !== null) {
                 console.error(`[FaceService] Process exited with code ${code}. Restarting in 1s...`);
                 setTimeout(() => this.start(), 1000);
@@ -309,11 +321,14 @@ class FaceService {
                 }
 
                 // Handle Verification Response
-                const pending = this.queue.shift();
+                const pending = this.pending.get(response.id);
                 if (pending) {
+                    clearTimeout(pending.timer);
+                    this.pending.delete(response.id);
+                    delete response.id;
                     pending.resolve(response);
                 } else {
-                    console.warn("[FaceService] Received response efficiently but no pending request:", response);
+                    console.warn("[FaceService] Received response but no pending request:", response);
                 }
 
             } catch (e) {
@@ -322,24 +337,128 @@ class FaceService {
         }
     }
 
-    async verify(img1_path, img2_path) {
+    // Send one request. `images` maps 'img1' (stored) / 'img2' (live) to a file path or a Buffer
+    // with the encoded image. Buffers are streamed as raw bytes right after the JSON line,
+    // so no temp files are needed. An array of Buffers is sent as several images of that name.
+    async request(payload, images = {}, timeoutMs = this.timeoutMs) {
         return new Promise((resolve, reject) => {
             if (!this.process || this.process.killed) {
                 return reject(new Error("FaceService is not running"));
             }
 
-            // Push to queue
-            this.queue.push({ resolve, reject });
+            // Register under a fresh id; the Python side echoes it back
+            const id = this.nextId++;
+            const timer = setTimeout(() => {
+                if (!this.pending.delete(id)) return;
+                reject(new Error(`FaceService request timed out after ${timeoutMs}ms`));
+            }, timeoutMs);
+            this.pending.set(id, { resolve, reject, timer });
+
+            const header = { ...payload, id };
+            const frames = [];
+            for (const [name, image] of Object.entries(images)) {
+                if (Array.isArray(image)) {
+                    header[`${name}_lens`] = image.map(frame => frame.length);
+                    frames.push(...image);
+                } else if (Buffer.isBuffer(image)) {
+                    header[`${name}_len`] = image.length;
+                    frames.push(image);
+                } else {
+                    header[`${name}_path`] = image;
+                }
+            }
 
-            // Send to Python
-            const payload = JSON.stringify({ img1_path, img2_path }) + '\n';
-            this.process.stdin.write(payload);
+            // Send to Python (header and frames are written back to back, so requests never interleave)
+            this.process.stdin.write(JSON.stringify(header) + '\n');
+            for (const frame of frames) this.process.stdin.write(frame);
         });
     }
+
+    async verify(storedImage, liveImage) {
+        return this.request({}, { img1: storedImage, img2: liveImage });
+    }
 }
 
 const faceService = new FaceService();
 
+// Resolve a stored face image (file path or Base64 / data URI) into what FaceService accepts
+function resolveFaceImage(imgData) {
+    if (imgData.includes('uploads') || (imgData.includes('.jpg') && !imgData.startsWith('data:'))) {
+        return path.isAbsolute(imgData) ? imgData : path.join(__dirname, imgData);
+    }
+    if (imgData.includes(",")) imgData = imgData.split(',')[1];
+    return Buffer.from(imgData, 'base64');
+}
+
+// Decode the live capture (Base64 / data URI), or a short burst of them sent as an array
+const MAX_LIVE_FRAMES = 5;
+function decodeLiveImage(liveImage) {
+    const decode = (liveData) => {
+        if (liveData.includes(",")) liveData = liveData.split(',')[1];
+        return Buffer.from(liveData, 'base64');
+    };
+    if (Array.isArray(liveImage)) return liveImage.slice(0, MAX_LIVE_FRAMES).map(decode);
+    return decode(liveImage);
+}
+
+// The photos of a beneficiary and their family members as { faceId, image } Buffers.
+// An unreadable photo (e.g. a missing upload) is logged and skipped, not fatal for the rest
+async function beneficiaryFaces(beneficiary) {
+    const prefix = `${beneficiary.card}:`;
+    const faces = [{ id: 'HEAD', image: beneficiary.image }];
+    for (const member of beneficiary.familyMembers || []) {
+        faces.push({ id: member._id.toString(), image: member.image });
+    }
+
+    const resolved = [];
+    for (const face of faces) {
+        if (!face.image) continue;
+        try {
+            const image = resolveFaceImage(face.image);
+            resolved.push({ faceId: prefix + face.id, image: Buffer.isBuffer(image) ? image : await fs.promises.readFile(image) });
+        } catch (err) {
+            console.error(`[FaceIndex] Skipping unreadable photo ${prefix + face.id}:`, err.message);
+        }
+    }
+    return resolved;
+}
+
+// Enroll faces in one shop with a single index write; replace rebuilds the shop from just these
+async function addShopFaces(shop, faces, replace = false) {
+    // Embedding a whole shop takes far longer than one verification
+    const result = await faceService.request(
+        { op: 'index_add_many', shop, face_ids: faces.map(face => face.faceId), replace },
+        { img1: faces.map(face => face.image) },
+        Math.max(faceService.timeoutMs, faces.length * 1000)
+    );
+    if (!result.success) {
+        console.error(`[FaceIndex] Failed to index shop ${shop}:`, result.error);
+        return result;
+    }
+    for (const failure of result.failed || []) {
+        console.error(`[FaceIndex] Failed to index ${failure.face_id}:`, failure.error);
+    }
+    return result;
+}
+
+// Keep the shop-wide face index in step with a beneficiary's photos.
+// Faces are indexed as `${card}:HEAD` / `${card}:${memberId}` under the assigned shop;
+// they are removed by card prefix from that shop, and from previousShop on a transfer
+async function syncFaceIndex(beneficiary, previousShop) {
+    const shops = new Set([previousShop, beneficiary.assignedShop].filter(Boolean).map(String));
+    for (const shop of shops) {
+        await faceService.request({ op: 'index_remove', shop, prefix: `${beneficiary.card}:` });
+    }
+    if (!beneficiary.assignedShop) return;
+
+    const faces = await beneficiaryFaces(beneficiary);
+    if (faces.length) await addShopFaces(beneficiary.assignedShop, faces);
+}
+
+function syncFaceIndexInBackground(beneficiary, previousShop) {
+    syncFaceIndex(beneficiary, previousShop).catch(err => console.error("[FaceIndex] Sync error:", err.message));
+}
+
 
 
 // --- AUTH ---
@@ -389,30 +508,19 @@ app.post('/api/auth/verify-employee-face', async (req, res) => {
             return res.status(400).json({ success: false, message: "No registered face found. Please contact Admin." });
         }
 
-        const uploadsDir = path.join(__dirname, 'uploads');
-        if (!fs.existsSync(uploadsDir)) fs.mkdirSync(uploadsDir, { recursive: true });
-
-        // 1. Prepare Stored Image
-        let storedImagePath = path.join(uploadsDir, `auth_stored_${user._id}.jpg`);
+        // 1. Prepare Stored Image (a file path, or decoded in memory)
+        let storedImage;
         try {
-            let imgData = user.image;
-            if (imgData.includes('uploads') || (imgData.includes('.jpg') && !imgData.startsWith('data:'))) {
-                storedImagePath = path.isAbsolute(imgData) ? imgData : path.join(__dirname, imgData);
-            } else {
-                if (imgData.includes(",")) imgData = imgData.split(',')[1];
-                fs.writeFileSync(storedImagePath, Buffer.from(imgData, 'base64'));
-            }
+            storedImage = resolveFaceImage(user.image);
         } catch (e) {
             console.error("Auth Stored Image Error:", e);
             return res.status(500).json({ success: false, message: "Failed to process stored image" });
         }
 
         // 2. Prepare Live Image
-        let liveImagePath = path.join(uploadsDir, `auth_live_${user._id}.jpg`);
+        let liveImageBuffer;
         try {
-            let liveData = liveImage;
-            if (liveData.includes(",")) liveData = liveData.split(',')[1];
-            fs.writeFileSync(liveImagePath, Buffer.from(liveData, 'base64'));
+            liveImageBuffer = decodeLiveImage(liveImage);
         } catch (e) {
             console.error("Auth Live Image Error:", e);
             return res.status(500).json({ success: false, message: "Failed to process live image" });
@@ -420,14 +528,9 @@ app.post('/api/auth/verify-employee-face', async (req, res) => {
 
         // 3. Verify
         try {
-            const result = await faceService.verify(storedImagePath, liveImagePath);
+            const result = await faceService.verify(storedImage, liveImageBuffer);
             console.log(`[Auth] Result for ${email}:`, result);
 
-            if (fs.existsSync(liveImagePath)) fs.unlinkSync(liveImagePath);
-            if (!user.image.includes('uploads') && !user.image.includes('.jpg')) {
-                if (fs.existsSync(storedImagePath)) fs.unlinkSync(storedImagePath);
-            }
-
             if (result.authenticated) {
                 res.json({
                     success: true,
@@ -614,7 +717,11 @@ app.post('/api/beneficiaries/assign', async (req, res) => {
 
 app.delete('/api/beneficiaries/:id', async (req, res) => {
     try {
-        await Beneficiary.findByIdAndDelete(req.params.id);
+        const deleted = await Beneficiary.findByIdAndDelete(req.params.id);
+        if (deleted && deleted.assignedShop) {
+            faceService.request({ op: 'index_remove', shop: deleted.assignedShop.toString(), prefix: `${deleted.card}:` })
+                .catch(err => console.error("[FaceIndex] Remove error:", err.message));
+        }
         res.json({ success: true, message: "Beneficiary Deleted" });
     } catch (err) {
         res.status(500).json({ error: err.message });
@@ -719,18 +826,21 @@ app.put('/api/beneficiary-requests/:id/status', async (req, res) => {
                 const exists = await Beneficiary.findOne({ card: benefData.card });
                 if (exists) return res.status(400).json({ error: "Cannot Approve: Card ID already exists in Active Database" });
 
-                await Beneficiary.create({
+                const created = await Beneficiary.create({
                     ...benefData,
                     status: 'Active',
                     assignedEmployee: request.submittedBy // Or keep null/logic
                 });
+                syncFaceIndexInBackground(created);
             } else if (type === 'UPDATE') {
+                const previous = await Beneficiary.findOne({ card: benefData.card }, 'assignedShop');
                 const updated = await Beneficiary.findOneAndUpdate(
                     { card: benefData.card },
                     { ...benefData, status: 'Active' }, // Ensure status stays active or updates if needed
                     { new: true }
                 );
                 if (!updated) return res.status(404).json({ error: "Original Beneficiary not found for update" });
+                syncFaceIndexInBackground(updated, previous && previous.assignedShop);
             }
 
             request.status = 'Approved';
@@ -796,6 +906,7 @@ app.put('/api/beneficiaries/card/:cardId', async (req, res) => {
         // Prevent modification of Card ID to avoid conflicts (or handle carefully if needed)
         delete updates.card;
 
+        const previous = await Beneficiary.findOne({ card: cardId }, 'assignedShop');
         const updatedBeneficiary = await Beneficiary.findOneAndUpdate(
             { card: cardId },
             { $set: updates },
@@ -806,6 +917,7 @@ app.put('/api/beneficiaries/card/:cardId', async (req, res) => {
             return res.status(404).json({ error: "Beneficiary not found" });
         }
 
+        syncFaceIndexInBackground(updatedBeneficiary, previous && previous.assignedShop);
         res.json(updatedBeneficiary);
     } catch (err) {
         res.status(500).json({ error: err.message });
@@ -829,14 +941,8 @@ app.post('/api/verify-face', async (req, res) => {
         // --- SIMPLE VERIFICATION ---
         console.log(`[Verify-Face] Check for ${cardId} (Member: ${memberId || 'HEAD'})`);
 
-        const uploadsDir = path.join(__dirname, 'uploads');
-        if (!fs.existsSync(uploadsDir)) {
-            console.log(`[Verify-Face] Creating missing uploads directory: ${uploadsDir}`);
-            fs.mkdirSync(uploadsDir, { recursive: true });
-        }
-
-        // 1. Prepare Stored Image
-        let storedImagePath = path.join(uploadsDir, `stored_${cardId}_${memberId || 'HEAD'}.jpg`);
+        // 1. Prepare Stored Image (a file path, or decoded in memory)
+        let storedImage;
         try {
             let imgData = user.image; // Default to Head
 
@@ -857,23 +963,12 @@ app.post('/api/verify-face', async (req, res) => {
 
             if (!imgData) throw new Error("User has no image data");
 
-            // Check if it's a file path (from migration)
-            if (imgData.includes('uploads') || (imgData.includes('.jpg') && !imgData.startsWith('data:'))) {
-                // It's a path!
-                // Resolve absolute path
-                if (path.isAbsolute(imgData)) {
-                    storedImagePath = imgData;
-                } else {
-                    storedImagePath = path.join(__dirname, imgData);
-                }
-                console.log(`   -> Using Existing Database Image File: ${storedImagePath}`);
+            // A file path (from migration) or Base64 / data URI
+            storedImage = resolveFaceImage(imgData);
+            if (Buffer.isBuffer(storedImage)) {
+                console.log(`   -> Decoded Database Image (${storedImage.length} bytes)`);
             } else {
-                // It's Base64
-                if (imgData.includes(",")) {
-                    imgData = imgData.split(',')[1];
-                }
-                fs.writeFileSync(storedImagePath, Buffer.from(imgData, 'base64'));
-                console.log(`   -> Saved Database Image to ${storedImagePath}`);
+                console.log(`   -> Using Existing Database Image File: ${storedImage}`);
             }
         } catch (e) {
             console.error("Failed to save DB image:", e);
@@ -887,49 +982,22 @@ app.post('/api/verify-face', async (req, res) => {
         }
 
         // 2. Prepare Live Image
-        let liveImagePath = path.join(uploadsDir, `live_${cardId}.jpg`);
+        let liveImageBuffer;
         try {
-            let liveData = liveImage;
-            if (!liveData) throw new Error("No live image data");
-
-            if (liveData.includes(",")) {
-                liveData = liveData.split(',')[1];
-            }
-            fs.writeFileSync(liveImagePath, Buffer.from(liveData, 'base64'));
-            console.log(`   -> Saved Live Image to ${liveImagePath}`);
+            if (!liveImage) throw new Error("No live image data");
+            liveImageBuffer = decodeLiveImage(liveImage);
         } catch (e) {
-            console.error("Failed to save Live image:", e);
+            console.error("Failed to decode Live image:", e);
             return res.status(400).json({ error: "Invalid Live Image format" });
         }
 
         // 3. Compare with DeepFace (VGG-Face) via Persistent Service
         console.log("[Verify-Face] Sending to Persistent Service...");
 
-        // Ensure files exist before sending
-        if (!fs.existsSync(storedImagePath) || !fs.existsSync(liveImagePath)) {
-            return res.status(500).json({ success: false, error: "Image files failed to persist before verification" });
-        }
-
         try {
-            const result = await faceService.verify(storedImagePath, liveImagePath);
+            const result = await faceService.verify(storedImage, liveImageBuffer);
             console.log("[Verify-Face] Result:", result);
 
-            // Cleanup
-            try {
-                // if (fs.existsSync(storedImagePath)) fs.unlinkSync(storedImagePath); // Don't delete stored if it's the source of truth, but here it's a copy if it was base64?
-                // Actually `storedImagePath` might be the real file from DB.
-                // Logic: 
-                // If it was created from Base64 (line 654), we should delete it? 
-                // Or if it's user.image path, we shouldn't.
-                // For safety, let's NOT delete storedImagePath if it looks like a permanent uploads path (stored_...).
-                // But the code above creates `stored_cardId_HEAD.jpg`.
-                // If we treat it as cache, we can keep it? 
-                // For now, let's keep the cleanup logic consistent with before OR strictly only clean up live image.
-                // The previous code cleaned up ALL.
-                if (fs.existsSync(storedImagePath)) fs.unlinkSync(storedImagePath);
-                if (fs.existsSync(liveImagePath)) fs.unlinkSync(liveImagePath);
-            } catch (cleanupErr) { console.error("Cleanup error:", cleanupErr); }
-
             // If liveness passed but match failed, or vice-versa
             if (result.match && !result.liveness) {
                 result.error = "⚠️ Spoofing Detected! Liveness check failed.";
@@ -952,6 +1020,70 @@ app.post('/api/verify-face', async (req, res) => {
     }
 });
 
+// --- CARD-LESS IDENTIFICATION ---
+// Search the shop's face index for a beneficiary who forgot their card
+app.post('/api/identify-face', async (req, res) => {
+    try {
+        const { shop, liveImage, k } = req.body;
+        if (!shop || !liveImage) return res.status(400).json({ error: "Shop and live image required" });
+
+        const result = await faceService.request({ op: 'search', shop, k: k || 5 }, { img2: decodeLiveImage(liveImage) });
+        if (!result.success) return res.status(400).json(result);
+
+        if (!result.authenticated) {
+            return res.json({
+                success: false,
+                match: result.match,
+                liveness: result.liveness,
+                error: result.match ? "⚠️ Spoofing Detected! Liveness check failed." : "No matching beneficiary at this shop"
+            });
+        }
+
+        const split = result.face_id.lastIndexOf(':');
+        const card = result.face_id.slice(0, split);
+        const memberId = result.face_id.slice(split + 1);
+        const beneficiary = await Beneficiary.findOne({ card });
+        if (!beneficiary) return res.status(404).json({ error: "Beneficiary not found" });
+
+        res.json({
+            success: true,
+            card,
+            memberId,
+            beneficiary,
+            confidence: result.candidates[0].confidence,
+            distance: result.candidates[0].distance,
+            liveness: result.liveness
+        });
+    } catch (err) {
+        console.error("[Identify-Face] Error:", err);
+        res.status(500).json({ error: err.message });
+    }
+});
+
+// Rebuild the face index for every beneficiary (e.g. after first deploying it)
+app.post('/api/face-index/rebuild', async (req, res) => {
+    try {
+        const beneficiaries = await Beneficiary.find({ assignedShop: { $exists: true, $ne: null } });
+
+        // One bulk request per shop, so each shop's index file is written once
+        const shops = new Map();
+        for (const beneficiary of beneficiaries) {
+            const shop = beneficiary.assignedShop.toString();
+            if (!shops.has(shop)) shops.set(shop, []);
+            shops.get(shop).push(...await beneficiaryFaces(beneficiary));
+        }
+
+        let faces = 0;
+        for (const [shop, shopFaces] of shops) {
+            const result = await addShopFaces(shop, shopFaces, true);
+            faces += result.added || 0;
+        }
+        res.json({ success: true, indexed: beneficiaries.length, faces });
+    } catch (err) {
+        res.status(500).json({ error: err.message });
+    }
+});
+
 // --- DISPENSE ---
 // --- DISPENSE & HARDWARE TRIGGER ---
 app.post('/api/dispense', async (req, res) => {
@@ -1409,16 +1541,82 @@ app.get('/api/tts', (req, res) => {
 });
 
 // --- SOCKET.IO SETUP ---
+const VISION_LEVELS = ['detail', 'thumbnail', 'stats'];
+const VISION_MESSAGES = {
+    danger: '⚠️ HAND DETECTED! PLEASE REMOVE HAND.',
+    warning: '⚠️ NO BAG DETECTED. PLEASE PLACE BAG PROPERLY.',
+    safe: '✅ BAG DETECTED. SAFE TO DISPENSE.'
+};
+// Latest vision state per camera (device_id -> { status, updatedAt }), so cameras never mix
+const visionState = new Map();
+// Camera watching the dispense in progress (sent as deviceId to /api/hardware/dispense);
+// null = not known, and then any camera's danger stops the dispenser
+let dispensingDevice = null;
+
+// A finished or lost dispense no longer belongs to any camera
+function trackDispensing(event) {
+    if (event === 'hardware:complete' || event === 'hardware:disconnected') dispensingDevice = null;
+}
+
+// Counters pick their camera with vision:subscribe { device }; until then they get every camera
+function visionRoom(deviceId) {
+    return deviceId ? `vision:device:${deviceId}` : 'vision:all';
+}
+
 io.on('connection', (socket) => {
     console.log('[Socket.IO] Client connected:', socket.id);
+    socket.join('vision:all');
 
     // --- Vision System Events ---
-    socket.on('vision:update', async (data) => {
-        // Broadcast to frontend
-        io.emit('vision:alert', data);
+    // Clients choose how much vision data they get: everyone receives vision:alert,
+    // 'detail' adds the full per-frame payloads, 'thumbnail' the low-rate ROI snapshots,
+    // 'stats' the periodic per-stage latency report. { device, levels } also limits
+    // vision:alert to one camera.
+    socket.on('vision:subscribe', (request) => {
+        let levels = request;
+        if (request && !Array.isArray(request) && typeof request === 'object') {
+            levels = request.levels;
+            if (request.device) {
+                socket.leave('vision:all');
+                socket.join(visionRoom(String(request.device)));
+            }
+        }
+        for (const level of [].concat(levels || [])) {
+            if (VISION_LEVELS.includes(level)) socket.join(`vision:${level}`);
+        }
+    });
 
-        // SAFETY INTERLOCK: If DANGER (Hand Detected), STOP DISPENSING
-        if (data.status === 'danger') {
+    socket.on('vision:unsubscribe', (levels) => {
+        for (const level of [].concat(levels || [])) {
+            socket.leave(`vision:${level}`);
+        }
+    });
+
+    socket.on('vision:detail', (data) => {
+        io.to('vision:detail').emit('vision:detail', data);
+    });
+
+    socket.on('vision:thumbnail', (data) => {
+        io.to('vision:thumbnail').emit('vision:thumbnail', data);
+    });
+
+    socket.on('vision:stats', (data) => {
+        io.to('vision:stats').emit('vision:stats', data);
+    });
+
+    socket.on('vision:update', async (data) => {
+        // The vision service sends a compact state; the message text is added here
+        const deviceId = data.device_id ? String(data.device_id) : null;
+        visionState.set(deviceId || 'default', { status: data.status, updatedAt: Date.now() });
+
+        // Only that camera's counter, plus clients watching every camera
+        const alert = { ...data, message: VISION_MESSAGES[data.status] || '' };
+        const rooms = deviceId ? [visionRoom(deviceId), 'vision:all'] : ['vision:all'];
+        io.to(rooms).emit('vision:alert', alert);
+
+        // SAFETY INTERLOCK: If DANGER (Hand Detected) at the dispensing counter, STOP DISPENSING
+        const watchesDispenser = !dispensingDevice || !deviceId || deviceId === dispensingDevice;
+        if (data.status === 'danger' && watchesDispenser) {
             try {
                 // Only log if we haven't logged recently to avoid spam
                 // console.log('[Safety] Hand Detected! Stopping Dispense...');
@@ -1436,6 +1634,7 @@ io.on('connection', (socket) => {
 
 // Setup hardware service event emitter
 hardwareService.setEventEmitter((event, data) => {
+    trackDispensing(event);
     io.emit(event, data);
 });
 
@@ -1469,7 +1668,7 @@ app.post('/api/hardware/connect', async (req, res) => {
 // Send dispense command
 app.post('/api/hardware/dispense', async (req, res) => {
     try {
-        const { grainType, weight } = req.body;
+        const { grainType, weight, deviceId } = req.body;
 
         // Validate inputs
         if (!grainType || !weight) {
@@ -1493,6 +1692,8 @@ app.post('/api/hardware/dispense', async (req, res) => {
             });
         }
 
+        // The vision interlock only listens to this counter's camera while it dispenses
+        dispensingDevice = deviceId ? String(deviceId) : null;
         const result = await hardwareService.dispense(parseInt(grainType), parseFloat(weight));
         res.json(result);
     } catch (err) {
@@ -1504,6 +1705,11 @@ app.post('/api/hardware/dispense', async (req, res) => {
     }
 });
 
+// Latest vision status of every camera
+app.get('/api/vision/status', (req, res) => {
+    res.json({ cameras: Object.fromEntries(visionState), dispensingDevice });
+});
+
 // Get hardware status
 app.get('/api/hardware/status', (req, res) => {
     try {
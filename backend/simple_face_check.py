@@ -2,6 +2,7 @@ import face_recognition
 import sys
 import json
 import os
+from image_utils import face_encodings_downscaled
 
 def check_face(stored_path, live_path):
     try:
@@ -19,12 +20,13 @@ def check_face(stored_path, live_path):
         stored_image = face_recognition.load_image_file(stored_path)
         live_image = face_recognition.load_image_file(live_path)
 
-        stored_encodings = face_recognition.face_encodings(stored_image, num_jitters=1)
-        live_encodings = face_recognition.face_encodings(live_image, num_jitters=1)
+        # Faces are located on a downscaled copy and encoded from the full image
+        stored_encodings = face_encodings_downscaled(stored_image, num_jitters=1)
+        live_encodings = face_encodings_downscaled(live_image, num_jitters=1)
 
         if len(stored_encodings) == 0:
             # Try once more with upsampling if failed
-            stored_encodings = face_recognition.face_encodings(stored_image, num_jitters=1, model="large")
+            stored_encodings = face_encodings_downscaled(stored_image, num_jitters=1, model="large")
             if len(stored_encodings) == 0:
                  return {"success": False, "error": "No face found in database photo (Try uploading a clearer photo)"}
         
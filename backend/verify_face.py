@@ -1,60 +1,64 @@
 import sys
-import os
 import json
-import base64
-import re
-from io import BytesIO
 
 # Import face_recognition with error handling
 try:
     import face_recognition
-    from PIL import Image
-    import numpy as np
+    from image_utils import (load_image_string, load_image_text, face_encodings_downscaled, map_references,
+                            early_exit_distance, EARLY_EXIT_DISTANCE, REF_WORKERS, REF_POOL)
 except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing library: {str(e)}"}))
     sys.exit(1)
 
+# Photos far larger than this are decoded at reduced size (JPEG draft mode);
+# HOG detection and the 128-d encoder gain nothing from more pixels
+MAX_DECODE_SIDE = 1280
+MATCH_TOLERANCE = 0.5 # 0.5 is a good strict threshold (default is 0.6)
+
 def load_image_from_content(content):
     """
     Tries to load an image from a string content.
     1. Check if it's a valid file path.
-    2. Check if it's a Base64 string.
+    2. Check if it's a Base64 string (optionally a data URI).
+    """
+    return load_image_string(content, MAX_DECODE_SIDE)
+
+def load_image_from_file(data_file):
+    """
+    Same as load_image_from_content for a .txt reference on disk, but streamed:
+    base64 is decoded in chunks and the format sniffed before any decoding.
+    """
+    return load_image_text(data_file, MAX_DECODE_SIDE)
+
+def encode_reference(ref_file):
+    """
+    (decoded, encoding) for one reference file: decoded is False when the image
+    could not be read, encoding is None when it holds no face.
     """
-    content = content.strip()
-    
-    # 1. Is it a file path?
-    if os.path.exists(content):
-        try:
-            return face_recognition.load_image_file(content)
-        except:
-            pass # Not a valid image file, maybe just a path string that exists as a folder?
-
-    # 2. Is it Base64?
-    # Remove data URI header if present
-    if content.startswith('data:image'):
-        content = re.sub(r'^data:image/.+;base64,', '', content)
-    
     try:
-        # Try decoding
-        image_data = base64.b64decode(content)
-        image = Image.open(BytesIO(image_data))
-        image = image.convert('RGB')
-        return np.array(image)
+        ref_img = load_image_from_file(ref_file)
+        if ref_img is None:
+            return False, None
+        ref_encodings = face_encodings_downscaled(ref_img)
+        return True, (ref_encodings[0] if ref_encodings else None)
     except Exception as e:
-        # print(f"Debug: Failed to decode base64: {e}", file=sys.stderr)
-        return None
+        # print(f"Debug: Error checking ref {ref_file}: {e}", file=sys.stderr)
+        return False, None
 
-def verify(live_data_file, ref_data_files):
+def verify(live_data_file, ref_data_files, early_exit=EARLY_EXIT_DISTANCE, workers=REF_WORKERS, pool=REF_POOL):
+    """
+    Compare the live image with each reference. With early_exit, scanning stops at
+    the first matching reference closer than that (clamped to MATCH_TOLERANCE);
+    with workers > 1 references are decoded and encoded on a thread/process pool.
+    """
+    early_exit = early_exit_distance(early_exit, MATCH_TOLERANCE)
     try:
         # 1. Load Live Image
-        with open(live_data_file, 'r', encoding='utf-8') as f:
-            live_content = f.read()
-        
-        live_img = load_image_from_content(live_content)
+        live_img = load_image_from_file(live_data_file)
         if live_img is None:
             return {"success": False, "error": "Could not decode Live Image"}
         
-        live_encodings = face_recognition.face_encodings(live_img)
+        live_encodings = face_encodings_downscaled(live_img)
         if not live_encodings:
             return {"success": False, "error": "No face found in camera feed"}
         
@@ -65,44 +69,42 @@ def verify(live_data_file, ref_data_files):
         verified = False
         
         valid_refs = 0
+        matched_index = None
+        checked = 0
 
-        for ref_file in ref_data_files:
-            try:
-                with open(ref_file, 'r', encoding='utf-8') as f:
-                    ref_content = f.read()
-                
-                ref_img = load_image_from_content(ref_content)
-                if ref_img is None:
-                    continue # Skip invalid refs
-                
-                valid_refs += 1
-                
-                ref_encodings = face_recognition.face_encodings(ref_img)
-                if not ref_encodings:
-                    continue
-                
-                ref_encoding = ref_encodings[0]
-
-                # Compare
-                # match = face_recognition.compare_faces([ref_encoding], live_encoding, tolerance=0.5)
-                distance = face_recognition.face_distance([ref_encoding], live_encoding)[0]
-                confidence = 1 - distance
-
-                if distance < 0.5: # 0.5 is a good strict threshold (default is 0.6)
-                    verified = True
-                    if confidence > best_match_confidence:
-                        best_match_confidence = confidence
-            except Exception as e:
-                # print(f"Debug: Error checking ref {ref_file}: {e}", file=sys.stderr)
+        for index, (decoded, ref_encoding) in map_references(encode_reference, ref_data_files, workers, pool):
+            checked += 1
+            if not decoded:
+                continue # Skip invalid refs
+
+            valid_refs += 1
+            if ref_encoding is None:
                 continue
 
+            # Compare
+            # match = face_recognition.compare_faces([ref_encoding], live_encoding, tolerance=0.5)
+            distance = face_recognition.face_distance([ref_encoding], live_encoding)[0]
+            confidence = 1 - distance
+
+            if distance < MATCH_TOLERANCE:
+                verified = True
+                if confidence > best_match_confidence:
+                    best_match_confidence = confidence
+                    matched_index = index
+
+            if early_exit is not None and distance < early_exit:
+                break # The match is certain; other references could only raise the confidence
+
         if valid_refs == 0:
             return {"success": False, "error": "No valid reference photos found in database"}
 
         return {
             "success": True,
             "match": verified,
-            "confidence": best_match_confidence
+            "confidence": best_match_confidence,
+            "matched_index": matched_index,
+            "matched_ref": ref_data_files[matched_index] if matched_index is not None else None,
+            "references_checked": checked
         }
 
     except Exception as e:
@@ -1,50 +1,278 @@
 import cv2
+import json
 import socketio
 import sys
+import threading
 import time
-import numpy as np
-from ultralytics import YOLO
 import os
+from bag_detector import load_bag_detector, BAG_WEIGHTS_PATH
+from vision_utils import LatestFrameReader, FrameScheduler, MotionGate, HandDetector, EventPublisher, StageTimers, load_device_config, load_devices, roi_pixels, replay_frames, replay_fps, load_ground_truth, truth_for
 
 # Suppress OpenCV warnings about MJPEG overread
 os.environ['OPENCV_FFMPEG_LOGLEVEL'] = '-8'
 
 # Configuration
-CAMERA_SOURCE = sys.argv[1] if len(sys.argv) > 1 else 0
+# With a source argument one camera is served; without one, every camera in
+# vision_config.json that has a "source" is served by this one process.
+# --benchmark replays a recorded video through the pipeline at full speed, offline.
+# --replay does the same for a video or image directory and writes every decision
+# to --out=<file.jsonl>, compared against --truth=<labels.jsonl> when given.
+ARGS = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+OPTIONS = dict(arg[2:].split("=", 1) if "=" in arg else (arg[2:], True) for arg in sys.argv[1:] if arg.startswith("--"))
+BENCHMARK = "benchmark" in OPTIONS
+REPLAY = "replay" in OPTIONS
+# The offline modes print one JSON report on stdout: everything else is logged to
+# stderr, and per-frame logging is off so console I/O does not count in the timings
+OFFLINE = BENCHMARK or REPLAY
+report_stdout = sys.stdout
+if OFFLINE:
+    sys.stdout = sys.stderr
+CAMERA_SOURCE = ARGS[0] if len(ARGS) > 0 else None
+DEVICE_ID = ARGS[1] if len(ARGS) > 1 else os.environ.get('VISION_DEVICE_ID')
 BACKEND_URL = 'http://localhost:5000'
 
+def env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except:
+        return default
+
+# Set when something needs the loop's attention before the next frame is due
+wake = threading.Event()
+
+# Rolling per-stage latencies, reported as vision:stats every VISION_STATS_INTERVAL seconds
+timers = StageTimers()
+STATS_INTERVAL = env_float('VISION_STATS_INTERVAL', 10.0)
+
 # Initialize Socket.IO with reconnection
 sio = socketio.Client(reconnection=True, reconnection_attempts=0, reconnection_delay=1)
 
 # Initialize AI Models
 print("Loading Models...")
 
+# VISION_BACKEND: "onnx" (ONNX Runtime, no torch), "ultralytics" (PyTorch weights),
+# or "auto" = onnx when models/best.onnx exists (see export_yolo_onnx.py)
+VISION_BACKEND = os.environ.get('VISION_BACKEND', 'auto').lower()
+VISION_ONNX_INT8 = os.environ.get('VISION_ONNX_INT8', '0') == '1'
+
 # Load BOTH YOLO models for comprehensive bag detection
 try:
     # Custom model for plastic/paper/garbage bags
-    model_custom = YOLO("C:/Users/rjpra/Downloads/Smart-PDS-main/Smart-PDS-main/backend/best.pt")
-    print("✅ Custom Model Loaded (best.pt)")
+    model_custom = load_bag_detector(
+        VISION_BACKEND,
+        int8=VISION_ONNX_INT8,
+        conf=0.3,
+        weights=os.environ.get('VISION_BAG_WEIGHTS', BAG_WEIGHTS_PATH)
+    )
+    print(f"✅ Custom Model Loaded (best, {model_custom.backend})")
     print("   Detecting: plastic bags, paper bags, garbage bags")
 except Exception as e:
     print(f"⚠️ Custom model failed: {e}")
     print("   Continuing with COCO model only...")
     model_custom = None
 
-try:
-    # Standard COCO model for backpacks/handbags/suitcases
-    model_coco = YOLO("yolov8n.pt")
-    print("✅ YOLO Model Loaded (yolov8n - COCO dataset)")
-    print("   Detecting: backpacks, handbags, suitcases")
-except Exception as e:
-    print(f"❌ Error loading YOLO model: {e}")
-    sys.exit(1)
+if model_custom is None or model_custom.backend == "ultralytics":
+    try:
+        from ultralytics import YOLO
+        # Standard COCO model for backpacks/handbags/suitcases
+        model_coco = YOLO("yolov8n.pt")
+        print("✅ YOLO Model Loaded (yolov8n - COCO dataset)")
+        print("   Detecting: backpacks, handbags, suitcases")
+    except Exception as e:
+        print(f"❌ Error loading YOLO model: {e}")
+        sys.exit(1)
 
-# Status State to avoid spamming
-last_status = None
-bag_detected_count = 0  # Stability counter
-no_bag_count = 0  # Stability counter
 STABILITY_THRESHOLD = 3  # Need 3 consistent readings to change state as requested 
 
+class Camera:
+    """
+    One dispensing counter: its capture thread, region of interest, and all the
+    per-camera state (stability counters, motion gate, hand detector, scheduler).
+    The bag model itself is shared by every camera.
+    """
+
+    def __init__(self, device_id, source, config, clock=time.time):
+        self.id = device_id
+        self.source = source
+        # Only the region under the spout is analysed (vision_config.json, per camera)
+        self.roi = config.get("roi")
+        self.hand_ratio = float(config.get("hand_ratio", 0.5))
+
+        # Capture thread, opened by main() (the benchmark reads the file itself)
+        self.reader = None
+
+        # Processing rate follows the counter: fast while dispensing or a hand is around,
+        # slow when nothing is happening (see FrameScheduler)
+        self.scheduler = FrameScheduler(
+            target_latency=env_float('VISION_TARGET_LATENCY', 0.2),
+            idle_fps=env_float('VISION_IDLE_FPS', 2.0),
+            hand_hold=env_float('VISION_HAND_HOLD', 3.0),
+            max_idle_load=env_float('VISION_IDLE_LOAD', 0.25),
+            wake=wake
+        )
+        self.next_time = 0.0
+
+        # YOLO only re-runs when the scene under the spout changes; otherwise its last answer is reused
+        self.motion_gate = MotionGate(
+            min_changed=env_float('VISION_MOTION_MIN_CHANGED', 0.02),
+            max_age=env_float('VISION_MOTION_MAX_AGE', 10.0),
+            clock=clock
+        )
+
+        # Skin-colour hand detector with its own stability counters
+        self.hand_detector = HandDetector(
+            ratio_threshold=self.hand_ratio,
+            scale=env_float('VISION_HAND_SCALE', 0.5),
+            confirm_frames=int(env_float('VISION_HAND_CONFIRM', 2)),
+            release_frames=int(env_float('VISION_HAND_RELEASE', 3))
+        )
+
+        # Status State to avoid spamming
+        self.last_status = None
+        self.published_status = None
+        self.bag_detected_count = 0  # Stability counter
+        self.no_bag_count = 0  # Stability counter
+        self.last_detections = []
+        self.last_frame = None
+
+    def prepare(self, frame):
+        """Resize, crop to the ROI and run hand detection; decide whether YOLO must run."""
+        # Resize frame to 640x480 for faster processing
+        with timers.time("resize"):
+            frame = cv2.resize(frame, (640, 480))
+        self.last_frame = frame  # Thumbnails show the whole view, with the ROI drawn on it
+
+        # Crop to the configured hopper/spout region; both detectors only see this
+        x1, y1, x2, y2 = roi_pixels(self.roi, 640, 480)
+        frame = frame[y1:y2, x1:x2]
+
+        # 1. Hand Detection (Simple skin color detection, ratio is over the ROI area)
+        with timers.time("skin"):
+            hand = self.hand_detector.update(frame)
+
+        with timers.time("motion"):
+            run_detection = model_custom is not None and self.motion_gate.should_run(frame)
+
+        return {
+            "frame": frame,
+            "offset": (x1, y1),
+            "hand": hand,
+            "run_detection": run_detection
+        }
+
+    def decide(self, stage, detections):
+        """Stability logic and final status; detections is None when YOLO was skipped."""
+        hand = stage["hand"]
+        hand_detected = hand["hand"]
+        x1, y1 = stage["offset"]
+        roi_height, roi_width = stage["frame"].shape[:2]
+
+        # 2. Object Detection - ONLY using custom model (best.pt)
+        # Static scene: the last detection result still holds
+        if detections is not None:
+            # Debug: show what was detected
+            for detection in ([] if OFFLINE else detections):
+                conf = detection["confidence"]
+                cls = detection["class"]
+                print(f"🎯 [{self.id}] Detected! Class: {cls}, Confidence: {conf:.2f}")
+            self.last_detections = detections
+        bag_detected_raw = len(self.last_detections) > 0
+        best = max(self.last_detections, key=lambda d: d["confidence"]) if self.last_detections else None
+
+        # Stability logic - Optimized
+        # If detecting, increment. If not, only reset if we miss 2 frames in a row.
+        if bag_detected_raw:
+            self.bag_detected_count = min(self.bag_detected_count + 1, 10) # Cap at 10
+            self.no_bag_count = 0
+            if not OFFLINE:
+                print(f"✅ [{self.id}] Consistent Detection: {self.bag_detected_count}/{STABILITY_THRESHOLD}")
+        else:
+            # Grace period: Don't reset immediately on one missed frame
+            self.no_bag_count += 1
+            if self.no_bag_count > 1: # Require 2 missed frames to reset
+                 self.bag_detected_count = max(0, self.bag_detected_count - 2) # Decay count instead of full reset
+
+        # Only change state after STABILITY_THRESHOLD consistent readings
+        if self.bag_detected_count >= STABILITY_THRESHOLD:
+            bag_detected = True
+        elif self.no_bag_count >= STABILITY_THRESHOLD:
+            bag_detected = False
+        else:
+            # Keep previous state during transition
+            bag_detected = (self.last_status == "safe")
+
+        # 3. Logic & Signaling
+        current_status = "safe"
+        message = "Ready"
+
+        if hand_detected:
+            current_status = "danger"
+            message = "⚠️ HAND DETECTED! PLEASE REMOVE HAND."
+        elif not bag_detected:
+            current_status = "warning"
+            message = "⚠️ NO BAG DETECTED. PLEASE PLACE BAG PROPERLY."
+        else:
+            current_status = "safe"
+            message = "✅ BAG DETECTED. SAFE TO DISPENSE."
+
+        self.last_status = current_status
+
+        return {
+            "device_id": self.id,
+            # Hand ratio when the hand decides the status, otherwise the best bag score
+            "confidence": round(hand["ratio"] if hand_detected else (best["confidence"] if best else 0.0), 3),
+            # Best bag box in 640x480 frame coordinates
+            "bag_box": [round(best["box"][0] + x1), round(best["box"][1] + y1),
+                        round(best["box"][2] + x1), round(best["box"][3] + y1)] if best else None,
+            "hand": hand_detected,
+            "hand_ratio": round(hand["ratio"], 3),
+            # Centroid of the skin pixels in 640x480 frame coordinates
+            "hand_centroid": [round(hand["centroid"][0] + x1), round(hand["centroid"][1] + y1)] if hand["centroid"] else None,
+            "bag": bag_detected,
+            # Region of interest in 640x480 frame coordinates
+            "roi": [x1, y1, x1 + roi_width, y1 + roi_height],
+            "status": current_status,
+            "message": message
+        }
+
+def process_frames(items):
+    """
+    Run the pipeline for several (camera, frame) pairs. Frames that need bag
+    detection go through the shared model in a single batched call.
+    Returns one vision:update payload per pair.
+    """
+    stages = [camera.prepare(frame) for camera, frame in items]
+    detections = [None] * len(items)
+
+    pending = [i for i, stage in enumerate(stages) if stage["run_detection"]]
+    if pending:
+        try:
+            with timers.time("yolo"):
+                results = model_custom.detect([stages[i]["frame"] for i in pending])
+            for i, result in zip(pending, results):
+                detections[i] = result
+        except Exception as e:
+            print(f"❌ Detection error: {e}")
+            # Same as the old behaviour: a failed detection counts as "no bag"
+            for i in pending:
+                detections[i] = []
+
+    with timers.time("decision"):
+        return [camera.decide(stage, result) for (camera, _), stage, result in zip(items, stages, detections)]
+
+def process_frame(camera, frame):
+    """Run hand and bag detection on one frame and return the vision:update payload."""
+    return process_frames([(camera, frame)])[0]
+
+def configured_cameras():
+    """(device_id, source, config) for every camera this process should serve."""
+    if CAMERA_SOURCE is not None:
+        return [(DEVICE_ID or "default", CAMERA_SOURCE, load_device_config(DEVICE_ID, CAMERA_SOURCE))]
+    devices = [device for device in load_devices() if device.get("source") is not None]
+    if devices:
+        return [(device.get("id", str(device["source"])), device["source"], device) for device in devices]
+    return [(DEVICE_ID or "default", 0, load_device_config(DEVICE_ID, 0))]
+
 @sio.event
 def connect():
     print("✅ Connected to Backend")
@@ -53,30 +281,61 @@ def connect():
 def disconnect():
     print("❌ Disconnected from Backend")
 
-def detect_hand_simple(frame):
-    """Simple hand detection using skin color in HSV space"""
-    # Convert to HSV
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-    
-    # Define skin color range in HSV
-    lower_skin = np.array([0, 20, 70], dtype=np.uint8)
-    upper_skin = np.array([20, 255, 255], dtype=np.uint8)
-    
-    # Create mask
-    mask = cv2.inRange(hsv, lower_skin, upper_skin)
-    
-    # Apply morphological operations to reduce noise
-    kernel = np.ones((5,5), np.uint8)
-    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
-    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
-    
-    # Count skin pixels
-    skin_pixels = cv2.countNonZero(mask)
-    total_pixels = frame.shape[0] * frame.shape[1]
-    skin_ratio = skin_pixels / total_pixels
-    
-    # If more than 15% of frame is skin color, consider it a hand (increased from 5%)
-    return skin_ratio > 0.5
+cameras = []
+
+# Dispenser state, broadcast by the hardware services through the backend
+@sio.on('hardware:dispensing_started')
+def on_dispensing_started(data):
+    for camera in cameras:
+        camera.scheduler.set_dispensing(True)
+
+@sio.on('hardware:complete')
+def on_dispensing_complete(data):
+    for camera in cameras:
+        camera.scheduler.set_dispensing(False)
+
+@sio.on('hardware:disconnected')
+def on_hardware_disconnected(data):
+    for camera in cameras:
+        camera.scheduler.set_dispensing(False)
+
+# Repeated states are rate-limited and quick changes coalesced; detail and thumbnails
+# only go to clients that subscribed to them (see vision:subscribe in server.js)
+publisher = EventPublisher(
+    sio.emit,
+    danger_interval=env_float('VISION_DANGER_INTERVAL', 0.5),
+    min_interval=env_float('VISION_MIN_INTERVAL', 0.2),
+    detail_interval=env_float('VISION_DETAIL_INTERVAL', 1.0),
+    thumbnail_interval=env_float('VISION_THUMBNAIL_INTERVAL', 0.0)
+)
+
+def note_published(camera, status, message=""):
+    """Record the status the backend now shows for this camera, logging changes."""
+    if status == camera.published_status:
+        return
+    camera.published_status = status
+    if OFFLINE:
+        return
+    if status == "danger":
+        print(f"🔴 [{camera.id}] DANGER: {message}")
+    elif status == "warning":
+        print(f"🟡 [{camera.id}] WARNING: {message}")
+    else:
+        print(f"🟢 [{camera.id}] SAFE: {message}")
+
+def emit_update(camera, payload):
+    with timers.time("emit"):
+        sent = publisher.publish(payload, camera.last_frame)
+    if sent:
+        note_published(camera, payload["status"], payload["message"])
+
+def flush_updates(cameras):
+    """Send coalesced changes that have waited long enough and record them per camera."""
+    by_id = {camera.id: camera for camera in cameras}
+    for message in publisher.flush():
+        camera = by_id.get(message["device_id"])
+        if camera is not None:
+            note_published(camera, message["status"], "(coalesced)")
 
 def main():
     try:
@@ -85,124 +344,191 @@ def main():
         print(f"❌ Could not connect to backend: {e}")
         return
 
-    # Open Camera
-    print(f"📷 Opening Camera: {CAMERA_SOURCE}")
-    cap = cv2.VideoCapture(CAMERA_SOURCE)
-    
-    if not cap.isOpened():
-        print("❌ Failed to open camera. Check URL or connection.")
+    # Open Cameras
+    for device_id, source, config in configured_cameras():
+        print(f"📷 Opening Camera {device_id}: {source}")
+        camera = Camera(device_id, source, config)
+        # Captured on its own thread, only the newest frame is kept
+        camera.reader = LatestFrameReader(source, timers=timers)
+        if not camera.reader.is_opened():
+            print(f"❌ Failed to open camera {device_id}. Check URL or connection.")
+            continue
+        if camera.roi:
+            print(f"🔲 [{device_id}] Region of interest: {camera.roi}")
+        camera.reader.start()
+        cameras.append(camera)
+
+    if not cameras:
+        sio.disconnect()
         return
 
-    print("🚀 Vision Service Running... Press Ctrl+C to quit.")
+    print(f"🚀 Vision Service Running ({len(cameras)} camera(s))... Press Ctrl+C to quit.")
 
-    frame_count = 0
+    next_stats = time.time() + STATS_INTERVAL
     try:
         while True:
-            # Declare all globals at the start
-            global bag_detected_count, no_bag_count, last_status
-            
-            ret, frame = cap.read()
-            if not ret:
-                print("⚠️ Frame read failed")
-                time.sleep(1)
-                continue
-
-            frame_count += 1
-            # Process every 3rd frame for speed (skip 2 frames)
-            if frame_count % 3 != 0:
-                continue
-
-            # Resize frame to 640x480 for faster processing
-            frame = cv2.resize(frame, (640, 480))
+            # Every camera whose next frame is due; frames that arrived while we were busy are dropped
+            now = time.time()
+            items, captured = [], []
+            for camera in cameras:
+                if camera.next_time > now:
+                    continue
+                frame, captured_at = camera.reader.read(timeout=0)
+                if frame is None:
+                    camera.next_time = now + 0.01  # Nothing new from this camera yet
+                    continue
+                items.append((camera, frame))
+                captured.append(captured_at)
 
-            # 1. Hand Detection (Simple skin color detection)
-            hand_detected = detect_hand_simple(frame)
-
-            # 2. Object Detection - ONLY using custom model (best.pt)
-            bag_detected_raw = False
-            
-            # check every 3 frames instead of 6 for better consistency
-            if frame_count % 3 == 0:
-                try:
-                    # ONLY use custom model for bag detection
-                    if model_custom:
-                        results_custom = model_custom(frame, verbose=False, conf=0.3, imgsz=320)
-                        num_detections = len(results_custom[0].boxes)
-                        
-                        if num_detections > 0:
-                            bag_detected_raw = True
-                            # Debug: show what was detected
-                            for box in results_custom[0].boxes:
-                                conf = float(box.conf[0])
-                                cls = int(box.cls[0])
-                                print(f"🎯 Detected! Class: {cls}, Confidence: {conf:.2f}")
-                        else:
-                            # print(f"❌ No detections") # reduced spam
-                            pass
-                except Exception as e:
-                    print(f"❌ Detection error: {e}")
-                    pass
-
-            # Stability logic - Optimized
-            # If detecting, increment. If not, only reset if we miss 2 frames in a row.
-            if bag_detected_raw:
-                bag_detected_count = min(bag_detected_count + 1, 10) # Cap at 10
-                no_bag_count = 0
-                print(f"✅ Consistent Detection: {bag_detected_count}/{STABILITY_THRESHOLD}")
-            else:
-                # Grace period: Don't reset immediately on one missed frame
-                no_bag_count += 1
-                if no_bag_count > 1: # Require 2 missed frames to reset
-                     bag_detected_count = max(0, bag_detected_count - 2) # Decay count instead of full reset
-
-            # Only change state after STABILITY_THRESHOLD consistent readings
-            if bag_detected_count >= STABILITY_THRESHOLD:
-                bag_detected = True
-            elif no_bag_count >= STABILITY_THRESHOLD:
-                bag_detected = False
-            else:
-                # Keep previous state during transition
-                bag_detected = (last_status == "safe")
-
-            # 3. Logic & Signaling
-            current_status = "safe"
-            message = "Ready"
-
-            if hand_detected:
-                current_status = "danger"
-                message = "⚠️ HAND DETECTED! PLEASE REMOVE HAND."
-            elif not bag_detected:
-                current_status = "warning"
-                message = "⚠️ NO BAG DETECTED. PLEASE PLACE BAG PROPERLY."
-            else:
-                current_status = "safe"
-                message = "✅ BAG DETECTED. SAFE TO DISPENSE."
-
-            payload = {
-                "hand": hand_detected,
-                "bag": bag_detected,
-                "status": current_status,
-                "message": message
-            }
+            if items:
+                started = time.perf_counter()
+                payloads = process_frames(items)
+                elapsed = time.perf_counter() - started
 
-            # Emit on change or if danger
-            if current_status != last_status or current_status == "danger":
-                sio.emit('vision:update', payload)
-                if current_status == "danger":
-                    print(f"🔴 DANGER: {message}")
-                elif current_status == "warning":
-                    print(f"🟡 WARNING: {message}")
-                else:
-                    print(f"🟢 SAFE: {message}")
-                last_status = current_status
+                for (camera, _), captured_at, payload in zip(items, captured, payloads):
+                    # How old the picture behind this decision is
+                    payload["frame_age_ms"] = round((time.time() - captured_at) * 1000)
+                    emit_update(camera, payload)
+                    # Capture to published decision
+                    timers.add("latency", time.time() - captured_at)
 
-            time.sleep(0.05)  # 20Hz frame grab, but only process every 3rd
+                    # Next frame according to measured processing time and counter activity
+                    was_active = camera.scheduler.active
+                    # An unconfirmed hand already switches to the fast rate, so confirmation is quick
+                    camera.scheduler.observe(elapsed, payload["hand"] or payload["hand_ratio"] > camera.hand_ratio)
+                    if camera.scheduler.active != was_active:
+                        print(f"⏱️ [{camera.id}] {'Active' if camera.scheduler.active else 'Idle'} mode: {camera.scheduler.fps():.1f} fps (frame takes {camera.scheduler.processing_time * 1000:.0f} ms)")
+                    camera.next_time = now + camera.scheduler.period()
+
+            # Coalesced changes that have waited long enough
+            flush_updates(cameras)
+
+            if STATS_INTERVAL > 0 and time.time() >= next_stats:
+                sio.emit('vision:stats', {
+                    "stages": timers.summary(),
+                    "cameras": {
+                        camera.id: {
+                            "fps": round(camera.scheduler.fps(), 2),
+                            "active": camera.scheduler.active,
+                            "dropped": camera.reader.dropped
+                        }
+                        for camera in cameras
+                    }
+                })
+                next_stats = time.time() + STATS_INTERVAL
+
+            # Sleep until the next camera is due, or until dispensing starts
+            wake.wait(max(0.0, min(camera.next_time for camera in cameras) - time.time()))
+            wake.clear()
 
     except KeyboardInterrupt:
         print("\n👋 Shutting down...")
     finally:
-        cap.release()
+        for camera in cameras:
+            camera.reader.stop()
         sio.disconnect()
 
+def benchmark(path):
+    """
+    Replay a recorded video (or image directory) through the full pipeline as fast
+    as possible (no backend, no scheduling) and print FPS, end-to-end latency and
+    per-stage percentiles as JSON. Events go through the publisher into a no-op emit.
+    """
+    global publisher
+
+    camera = Camera(DEVICE_ID or "benchmark", path, load_device_config(DEVICE_ID, path))
+    publisher = EventPublisher(lambda event, data: None)
+    print(f"⏱️ Benchmarking {path} ({model_custom.backend if model_custom else 'no bag model'})...")
+
+    frames = 0
+    started = time.perf_counter()
+    frame_started = started
+    for _, _, frame in replay_frames(path):
+        timers.add("capture", time.perf_counter() - frame_started)
+
+        payload = process_frame(camera, frame)
+        emit_update(camera, payload)
+        timers.add("latency", time.perf_counter() - frame_started)
+        frames += 1
+        frame_started = time.perf_counter()
+
+    wall = time.perf_counter() - started
+    report = {
+        "video": path,
+        "backend": model_custom.backend if model_custom else None,
+        "frames": frames,
+        "seconds": round(wall, 3),
+        "fps": round(frames / wall, 2) if wall > 0 else 0.0,
+        "stages": timers.summary()
+    }
+    report_stdout.write(json.dumps(report, indent=2) + "\n")
+
+def replay(path, out_path, truth_path=None):
+    """
+    Headless, deterministic run of the hand/bag decision pipeline over a video or
+    image directory: no backend, no sleeping, and the motion gate runs on video time
+    instead of wall time. Writes one JSON line per frame and prints an accuracy
+    summary for the frames that have ground truth.
+    """
+    fps = replay_fps(path, env_float('VISION_REPLAY_FPS', 10.0))
+    video_time = [0.0]
+    camera = Camera(DEVICE_ID or "replay", path, load_device_config(DEVICE_ID, path), clock=lambda: video_time[0])
+    labels = load_ground_truth(truth_path) if truth_path else []
+
+    fields = ("status", "hand", "bag")
+    checked = {field: 0 for field in fields}
+    correct = {field: 0 for field in fields}
+    confusion = {}  # expected status -> decided status -> frames
+    frames = 0
+    started = time.perf_counter()
+
+    with open(out_path, "w", encoding="utf-8") as out:
+        for index, name, frame in replay_frames(path):
+            video_time[0] = index / fps
+            payload = process_frame(camera, frame)
+
+            row = {
+                "frame": index,
+                "name": name,
+                "time": round(video_time[0], 3),
+                "status": payload["status"],
+                "hand": payload["hand"],
+                "bag": payload["bag"],
+                "hand_ratio": payload["hand_ratio"],
+                "confidence": payload["confidence"],
+                "bag_box": payload["bag_box"]
+            }
+
+            truth = truth_for(labels, index, name)
+            if truth:
+                row["truth"] = truth
+                row["correct"] = all(payload[field] == expected for field, expected in truth.items())
+                for field, expected in truth.items():
+                    checked[field] += 1
+                    correct[field] += int(payload[field] == expected)
+                if "status" in truth:
+                    decided = confusion.setdefault(truth["status"], {})
+                    decided[payload["status"]] = decided.get(payload["status"], 0) + 1
+
+            out.write(json.dumps(row) + "\n")
+            frames += 1
+
+    wall = time.perf_counter() - started
+    summary = {
+        "source": path,
+        "decisions": out_path,
+        "frames": frames,
+        "fps": round(frames / wall, 2) if wall > 0 else 0.0,
+        "accuracy": {field: round(correct[field] / checked[field], 4) for field in fields if checked[field]},
+        "labelled": {field: checked[field] for field in fields if checked[field]},
+        "status_confusion": confusion
+    }
+    report_stdout.write(json.dumps(summary, indent=2) + "\n")
+
 if __name__ == "__main__":
-    main()
+    if REPLAY:
+        replay(CAMERA_SOURCE, OPTIONS.get("out", "vision_replay.jsonl"), OPTIONS.get("truth"))
+    elif BENCHMARK:
+        benchmark(CAMERA_SOURCE)
+    else:
+        main()
@@ -0,0 +1,575 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Per-camera settings (id, source, region of interest), one entry per installed counter
+VISION_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "vision_config.json")
+
+
+def load_devices(path: str = VISION_CONFIG_PATH) -> List[Dict]:
+    """All camera entries of the device config file ([] when there is none)."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("devices", [])
+
+
+def load_device_config(device_id: Optional[str] = None, source=None, path: str = VISION_CONFIG_PATH) -> Dict:
+    """
+    Settings of one camera from the device config file, looked up by id, or else
+    by camera source. Returns {} when there is no file or no matching entry.
+
+    {"devices": [{"id": "counter-1", "source": "http://10.0.0.5:81/stream",
+                  "roi": [0.25, 0.35, 0.5, 0.6], "hand_ratio": 0.5}]}
+
+    roi is (x, y, width, height) as fractions of the frame, so it survives a
+    change of camera resolution.
+    """
+    devices = load_devices(path)
+    for device in devices:
+        if device_id is not None and device.get("id") == device_id:
+            return device
+    for device in devices:
+        if source is not None and str(device.get("source")) == str(source):
+            return device
+    return {}
+
+
+def roi_pixels(roi, width: int, height: int) -> Tuple[int, int, int, int]:
+    """Fractional (x, y, w, h) ROI -> clamped pixel (x1, y1, x2, y2); whole frame when roi is None."""
+    if not roi:
+        return 0, 0, width, height
+    x, y, w, h = roi
+    x1 = min(max(int(round(x * width)), 0), width - 1)
+    y1 = min(max(int(round(y * height)), 0), height - 1)
+    x2 = min(max(int(round((x + w) * width)), x1 + 1), width)
+    y2 = min(max(int(round((y + h) * height)), y1 + 1), height)
+    return x1, y1, x2, y2
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def replay_frames(path: str) -> Iterator[Tuple[int, str, np.ndarray]]:
+    """
+    (index, name, BGR frame) for every frame of a recorded video, or for every
+    image of a directory in file-name order (name is the file name there).
+    """
+    if os.path.isdir(path):
+        names = sorted(name for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTENSIONS))
+        for index, name in enumerate(names):
+            frame = cv2.imread(os.path.join(path, name))
+            if frame is not None:
+                yield index, name, frame
+        return
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Failed to open video: {path}")
+    try:
+        index = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield index, str(index), frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def replay_fps(path: str, default: float = 10.0) -> float:
+    """Frame rate of a recorded video (default for image directories or unknown rates)."""
+    if os.path.isdir(path):
+        return default
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0
+    cap.release()
+    return fps if fps and fps > 0 else default
+
+
+def load_ground_truth(path: str) -> List[Dict]:
+    """
+    Expected decisions for a replay, one JSON object per line, either for one frame
+    ({"frame": 12} or {"frame": "img_0012.jpg"}) or an inclusive range of frame
+    indexes ({"start": 0, "end": 120}), with any of "status", "hand" and "bag".
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def truth_for(labels: List[Dict], index: int, name: str) -> Optional[Dict]:
+    """The label covering a frame, or None; fields other than status/hand/bag are dropped."""
+    for label in labels:
+        if "frame" in label:
+            matches = label["frame"] == index or str(label["frame"]) == name
+        else:
+            matches = label.get("start", 0) <= index <= label.get("end", index)
+        if matches:
+            return {key: label[key] for key in ("status", "hand", "bag") if key in label}
+    return None
+
+
+class StageTimers:
+    """
+    Rolling per-stage latency record: the last window durations of every stage
+    (capture, resize, skin, yolo, decision, emit, ...) and their percentiles.
+    Safe to feed from the capture thread and the inference loop at once.
+    """
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    @contextmanager
+    def time(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def summary(self) -> Dict[str, Dict]:
+        """{stage: {count, mean_ms, p50_ms, p90_ms, p99_ms, max_ms}} over the window."""
+        with self._lock:
+            snapshot = {stage: np.array(samples) for stage, samples in self._samples.items() if samples}
+        summary = {}
+        for stage, values in snapshot.items():
+            p50, p90, p99 = np.percentile(values, [50, 90, 99]) * 1000
+            summary[stage] = {
+                "count": int(len(values)),
+                "mean_ms": round(float(values.mean() * 1000), 2),
+                "p50_ms": round(float(p50), 2),
+                "p90_ms": round(float(p90), 2),
+                "p99_ms": round(float(p99), 2),
+                "max_ms": round(float(values.max() * 1000), 2)
+            }
+        return summary
+
+
+class LatestFrameReader:
+    """
+    Reads a camera on its own thread and keeps only the newest frame.
+
+    cv2.VideoCapture buffers frames internally; if the consumer is slower than the
+    camera, every read() returns an older frame and the stream falls seconds behind.
+    Here the capture thread drains the camera as fast as it delivers and overwrites
+    a single slot, so the inference loop always gets the current picture and frames
+    it had no time for are simply dropped.
+    """
+
+    def __init__(self, source, retry_delay: float = 1.0, timers: Optional[StageTimers] = None):
+        self.source = source
+        self.retry_delay = retry_delay
+        self.timers = timers
+
+        self.cap = cv2.VideoCapture(source)
+        # Ask the backend for the smallest internal queue (ignored by some backends)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self._frame: Optional[np.ndarray] = None
+        self._frame_time = 0.0
+        self._frame_id = 0
+        self._consumed_id = 0
+        self.dropped = 0
+
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def is_opened(self) -> bool:
+        return self.cap.isOpened()
+
+    def start(self) -> "LatestFrameReader":
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_loop, name="capture", daemon=True)
+        self._thread.start()
+        return self
+
+    def _capture_loop(self) -> None:
+        while self._running:
+            started = time.perf_counter()
+            ret, frame = self.cap.read()
+            if ret and self.timers is not None:
+                self.timers.add("capture", time.perf_counter() - started)
+            if not ret:
+                print("⚠️ Frame read failed")
+                time.sleep(self.retry_delay)
+                continue
+
+            with self._cond:
+                if self._frame_id > self._consumed_id:
+                    self.dropped += 1  # Overwritten before the consumer took it
+                self._frame = frame
+                self._frame_time = time.time()
+                self._frame_id += 1
+                self._cond.notify_all()
+
+    def read(self, timeout: float = 1.0) -> Tuple[Optional[np.ndarray], float]:
+        """
+        Wait for a frame newer than the last one returned and take it.
+        Returns (frame, capture_time), or (None, 0.0) on timeout.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frame_id > self._consumed_id or not self._running, timeout):
+                return None, 0.0
+            if self._frame_id <= self._consumed_id:
+                return None, 0.0
+            self._consumed_id = self._frame_id
+            return self._frame, self._frame_time
+
+    def stop(self) -> None:
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self.cap.release()
+
+
+class FrameScheduler:
+    """
+    Decides how long the inference loop waits before taking the next frame.
+
+    The time each frame takes to process is measured (smoothed), and the wait is
+    derived from it instead of a fixed frame skip:
+    - active (dispenser running, or a hand seen in the last hand_hold seconds):
+      a new decision at least every target_latency seconds, as fast as the CPU allows
+    - idle (counter empty): idle_fps, and never more than max_idle_load of one core
+    """
+
+    def __init__(
+        self,
+        target_latency: float = 0.2,
+        idle_fps: float = 2.0,
+        hand_hold: float = 3.0,
+        max_idle_load: float = 0.25,
+        smoothing: float = 0.2,
+        wake: Optional[threading.Event] = None
+    ):
+        self.target_latency = target_latency
+        self.idle_period = 1.0 / max(idle_fps, 0.1)
+        self.hand_hold = hand_hold
+        self.max_idle_load = max(0.01, min(1.0, max_idle_load))
+        self.smoothing = smoothing
+
+        self.processing_time = 0.0  # Smoothed seconds per processed frame
+        self.dispensing = False
+        self.last_hand_time = 0.0
+        # May be shared by several schedulers that are served by one loop
+        self._wake = wake or threading.Event()
+
+    def set_dispensing(self, active: bool) -> None:
+        self.dispensing = active
+        if active:
+            self._wake.set()  # Cut an idle wait short
+
+    @property
+    def active(self) -> bool:
+        return self.dispensing or (time.time() - self.last_hand_time) < self.hand_hold
+
+    def observe(self, processing_seconds: float, hand_detected: bool) -> None:
+        """Record how long the last frame took and whether it showed a hand."""
+        if self.processing_time == 0.0:
+            self.processing_time = processing_seconds
+        else:
+            self.processing_time += self.smoothing * (processing_seconds - self.processing_time)
+        if hand_detected:
+            self.last_hand_time = time.time()
+
+    def period(self) -> float:
+        """Seconds between the starts of two processed frames."""
+        if self.active:
+            # A change is seen after at most one period plus one processing time
+            return max(self.processing_time, self.target_latency - self.processing_time)
+        return max(self.idle_period, self.processing_time / self.max_idle_load)
+
+    def fps(self) -> float:
+        return 1.0 / max(self.period(), 1e-3)
+
+
+class MotionGate:
+    """
+    Tells the caller when a frame has changed enough to be worth running YOLO on.
+
+    Frames are compared, at low resolution and in grayscale, against the frame the
+    last detection ran on (not the previous frame, so slow changes add up). When
+    less than min_changed of the pixels differ the last detection result still holds.
+    A detection is forced every max_age seconds to recover from lighting drift.
+    """
+
+    def __init__(
+        self,
+        size: Tuple[int, int] = (160, 120),
+        pixel_threshold: int = 25,
+        min_changed: float = 0.02,
+        max_age: float = 10.0,
+        clock=time.time
+    ):
+        self.size = size
+        # Replays pass a clock driven by the video's own timestamps, so results are repeatable
+        self.clock = clock
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.max_age = max_age
+
+        self._reference: Optional[np.ndarray] = None
+        self._reference_time = 0.0
+        self._small = np.empty((size[1], size[0]), dtype=np.uint8)
+        self._diff = np.empty_like(self._small)
+        self.changed = 1.0  # Fraction of changed pixels in the last check
+
+    def _downscale(self, frame: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        cv2.resize(gray, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(self._small, (5, 5), 0)
+
+    def should_run(self, frame: np.ndarray) -> bool:
+        small = self._downscale(frame)
+        if self._reference is None or self.clock() - self._reference_time > self.max_age:
+            self.changed = 1.0
+        else:
+            cv2.absdiff(small, self._reference, dst=self._diff)
+            self.changed = np.count_nonzero(self._diff > self.pixel_threshold) / self._diff.size
+
+        if self.changed < self.min_changed:
+            return False
+
+        self._reference = small
+        self._reference_time = self.clock()
+        return True
+
+
+class HandDetector:
+    """
+    Skin-colour hand detector for the hopper region.
+
+    Works on a downscaled copy of the frame with buffers that are allocated once and
+    reused (they are only rebuilt if the frame size changes), and reports the skin
+    ratio plus the centroid of the skin pixels. Like the bag stability counters, the
+    hand state only turns on after confirm_frames positive frames in a row and off
+    after release_frames negative ones, so single noisy frames do not flip it.
+    """
+
+    LOWER_SKIN = np.array([0, 20, 70], dtype=np.uint8)
+    UPPER_SKIN = np.array([20, 255, 255], dtype=np.uint8)
+
+    def __init__(
+        self,
+        ratio_threshold: float = 0.5,
+        scale: float = 0.5,
+        confirm_frames: int = 2,
+        release_frames: int = 3
+    ):
+        self.ratio_threshold = ratio_threshold
+        self.scale = scale
+        self.confirm_frames = max(1, confirm_frames)
+        self.release_frames = max(1, release_frames)
+
+        # 5x5 morphology at full resolution is roughly 3x3 at half
+        k = max(3, int(round(5 * scale)) | 1)
+        self.kernel = np.ones((k, k), np.uint8)
+
+        self._shape = None
+        self.hand = False
+        self._positive = 0
+        self._negative = 0
+
+    def _allocate(self, shape) -> None:
+        h, w = shape[:2]
+        self._size = (max(1, int(w * self.scale)), max(1, int(h * self.scale)))
+        small_h, small_w = self._size[1], self._size[0]
+        self._small = np.empty((small_h, small_w, 3), dtype=np.uint8)
+        self._hsv = np.empty_like(self._small)
+        self._mask = np.empty((small_h, small_w), dtype=np.uint8)
+        self._closed = np.empty_like(self._mask)
+        self._shape = shape
+
+    def skin(self, frame: np.ndarray) -> Tuple[float, Optional[Tuple[float, float]]]:
+        """(skin ratio, centroid in frame pixels or None) for one BGR frame."""
+        if frame.shape != self._shape:
+            self._allocate(frame.shape)
+
+        cv2.resize(frame, self._size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2HSV, dst=self._hsv)
+        cv2.inRange(self._hsv, self.LOWER_SKIN, self.UPPER_SKIN, dst=self._mask)
+
+        # Close then open to reduce noise
+        cv2.morphologyEx(self._mask, cv2.MORPH_CLOSE, self.kernel, dst=self._closed)
+        cv2.morphologyEx(self._closed, cv2.MORPH_OPEN, self.kernel, dst=self._mask)
+
+        moments = cv2.moments(self._mask, binaryImage=True)
+        count = moments["m00"]
+        ratio = count / self._mask.size
+        if count == 0:
+            return ratio, None
+        fx = frame.shape[1] / self._size[0]
+        fy = frame.shape[0] / self._size[1]
+        return ratio, (moments["m10"] / count * fx, moments["m01"] / count * fy)
+
+    def update(self, frame: np.ndarray) -> Dict:
+        """Measure one frame and advance the smoothed hand state."""
+        ratio, centroid = self.skin(frame)
+        raw = ratio > self.ratio_threshold
+
+        if raw:
+            self._positive += 1
+            self._negative = 0
+            if self._positive >= self.confirm_frames:
+                self.hand = True
+        else:
+            self._negative += 1
+            self._positive = 0
+            if self._negative >= self.release_frames:
+                self.hand = False
+
+        return {"hand": self.hand, "raw": raw, "ratio": ratio, "centroid": centroid}
+
+
+class EventPublisher:
+    """
+    Rate-limits and coalesces vision events before they go to the backend.
+
+    - vision:update carries only the compact state (status code, confidence,
+      timestamp, bag box). A change to danger is sent at once and repeated at most
+      every danger_interval while it lasts; other changes are sent at most every
+      min_interval per camera, and when several happen in between only the latest
+      is sent (a flicker that returns to the sent state is dropped).
+    - vision:detail (the full payload) and vision:thumbnail (a small JPEG of the
+      frame with the region of interest, bag box and hand centroid drawn in the
+      status color) are sent at their own low rates, 0 disables them.
+    The backend relays detail and thumbnails only to clients that subscribed.
+    """
+
+    STATUS_CODES = {"safe": 0, "warning": 1, "danger": 2}
+    STATUS_COLORS = {"safe": (0, 200, 0), "warning": (0, 200, 255), "danger": (0, 0, 255)}  # BGR
+
+    def __init__(
+        self,
+        emit,
+        danger_interval: float = 0.5,
+        min_interval: float = 0.2,
+        detail_interval: float = 1.0,
+        thumbnail_interval: float = 0.0,
+        thumbnail_width: int = 160
+    ):
+        self.emit = emit
+        self.danger_interval = danger_interval
+        self.min_interval = min_interval
+        self.detail_interval = detail_interval
+        self.thumbnail_interval = thumbnail_interval
+        self.thumbnail_width = thumbnail_width
+        self._devices: Dict[str, Dict] = {}
+
+    @classmethod
+    def compact(cls, payload: Dict) -> Dict:
+        status = payload["status"]
+        return {
+            "device_id": payload.get("device_id"),
+            "status": status,
+            "code": cls.STATUS_CODES.get(status, -1),
+            "conf": payload.get("confidence"),
+            "ts": int(time.time() * 1000),
+            "bbox": payload.get("bag_box"),
+            "hand": payload.get("hand"),
+            "bag": payload.get("bag")
+        }
+
+    def _send(self, state: Dict, message: Dict, now: float) -> None:
+        self.emit('vision:update', message)
+        state["status"] = message["status"]
+        state["time"] = now
+        state["pending"] = None
+
+    def thumbnail(self, payload: Dict, frame: np.ndarray) -> np.ndarray:
+        """
+        Downscaled copy of the frame the payload's coordinates refer to, annotated
+        with the region of interest, the best bag box and the hand centroid.
+        """
+        scale = self.thumbnail_width / frame.shape[1]
+        small = cv2.resize(frame, (self.thumbnail_width, max(1, int(frame.shape[0] * scale))))
+        color = self.STATUS_COLORS.get(payload["status"], (255, 255, 255))
+
+        def point(x, y):
+            return int(round(x * scale)), int(round(y * scale))
+
+        roi = payload.get("roi")
+        if roi:
+            cv2.rectangle(small, point(roi[0], roi[1]), point(roi[2], roi[3]), (255, 255, 255), 1)
+        box = payload.get("bag_box")
+        if box:
+            cv2.rectangle(small, point(box[0], box[1]), point(box[2], box[3]), color, 2)
+        centroid = payload.get("hand_centroid")
+        if centroid:
+            cv2.circle(small, point(*centroid), 4, color, -1)
+        cv2.putText(small, payload["status"].upper(), (4, 14), cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1, cv2.LINE_AA)
+        return small
+
+    def publish(self, payload: Dict, frame: Optional[np.ndarray] = None) -> bool:
+        """
+        Offer one decision; returns True when a vision:update went out. frame is the
+        full frame the payload's coordinates refer to (used for the thumbnail).
+        """
+        now = time.time()
+        state = self._devices.setdefault(payload.get("device_id"), {
+            "status": None, "time": 0.0, "pending": None, "detail": 0.0, "thumbnail": 0.0
+        })
+        message = self.compact(payload)
+        status = message["status"]
+        sent = False
+
+        if status == "danger":
+            if state["status"] != "danger" or now - state["time"] >= self.danger_interval:
+                self._send(state, message, now)
+                sent = True
+        elif status != state["status"]:
+            if now - state["time"] >= self.min_interval:
+                self._send(state, message, now)
+                sent = True
+            else:
+                state["pending"] = message  # Coalesced: only the latest change is kept
+        else:
+            state["pending"] = None
+
+        if self.detail_interval > 0 and now - state["detail"] >= self.detail_interval:
+            self.emit('vision:detail', payload)
+            state["detail"] = now
+
+        if frame is not None and self.thumbnail_interval > 0 and now - state["thumbnail"] >= self.thumbnail_interval:
+            ok, jpeg = cv2.imencode(".jpg", self.thumbnail(payload, frame), [cv2.IMWRITE_JPEG_QUALITY, 70])
+            if ok:
+                self.emit('vision:thumbnail', {
+                    "device_id": payload.get("device_id"),
+                    "ts": message["ts"],
+                    "status": status,
+                    "jpeg": jpeg.tobytes()
+                })
+            state["thumbnail"] = now
+
+        return sent
+
+    def flush(self) -> List[Dict]:
+        """Send coalesced changes whose min_interval has passed; returns the messages sent."""
+        now = time.time()
+        sent = []
+        for state in self._devices.values():
+            pending = state["pending"]
+            if pending is not None and now - state["time"] >= self.min_interval:
+                pending["ts"] = int(now * 1000)
+                self._send(state, pending, now)
+                sent.append(pending)
+        return sent